@@ -0,0 +1,211 @@
+"""
+Command line acquisition tool for PCF8591 chips.
+
+Usage:
+    python3 -m acquire scan [--bus N] [--cache TOPOLOGY_FILE]
+    python3 -m acquire sample [--bus N] [--device D] [--channels 0,1,2,3] [--rate HZ] [--count N]
+                              [--burst N] [--volts] [--calibration FILE] [--output CAPTURE_FILE]
+    python3 -m acquire dac VALUE [VALUE ...] [--bus N] [--device D] [--repeat N] [--rate HZ]
+    python3 -m acquire calibrate FILE --sources D,D,D,D [--bus N] [--device D] [--oversample N]
+
+Samples are printed as "timestamp_ns,value,..." lines or written to a capture file (see capture.py).
+A single channel sampled with --rate 0 is read in bursts of --burst conversions, otherwise
+all channels are read in one transaction per scan and paced to --rate scans per second.
+calibrate sweeps the DACs of the source devices wired to AIN0 to AIN3 ('-' for pins not wired)
+and adds the correction tables of the device to the calibration file used by sample --calibration.
+"""
+import argparse
+import sys
+import time
+
+import bus_registry
+from pcf8591 import Pcf8591, MAX_BURST_LENGTH
+
+
+def channel_list(text):
+    """Parse comma separated AIN channels of --channels, only 0 to 3 are valid."""
+    try:
+        channels = [int(channel) for channel in text.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("channels must be comma separated numbers")
+    if not all(0 <= channel <= 3 for channel in channels):
+        raise argparse.ArgumentTypeError("channels must be 0 to 3")
+    return channels
+
+
+def positive_int(text):
+    """Parse whole number of an option that needs at least 1, e.g. --burst."""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("{!r} is not a whole number".format(text))
+    if value < 1:
+        raise argparse.ArgumentTypeError("value must be at least 1")
+    return value
+
+
+def open_driver(args):
+    """Return Pcf8591 driver for device index (A2 A1 A0 bits) selected on command line."""
+    device = args.device
+    return Pcf8591(device & 1, device >> 1 & 1, device >> 2 & 1, args.vref, args.vagnd,
+                   bus_number=args.bus, pipelined=True)
+
+
+def scan(args):
+    """Print PCF8591 devices answering on the bus, directly or behind TCA9548A switches."""
+    import topology
+    if args.cache:
+        found = topology.load_or_discover(args.cache, [args.bus])
+    else:
+        found = topology.discover([args.bus])
+    for location in found.devices:
+        line = "0x{:02x} device {}".format(location.address, location.address & 7)
+        if location.mux_address is not None:
+            line += " mux 0x{:02x} channel {}".format(location.mux_address, location.mux_channel)
+        print(line)
+    return 0 if found.devices else 1
+
+
+def sample(args):
+    """Read samples and print them or write them to capture file."""
+    driver = open_driver(args)
+    if driver.i2c_bus is None:
+        return 1
+    channels = args.channels
+    if args.calibration:
+        import calibration
+        calibration.apply([driver], calibration.load(args.calibration))
+    writer = None
+    if args.output:
+        from capture import CaptureWriter
+        writer = CaptureWriter(args.output, driver.i2c_address, args.vref, args.vagnd, args.rate, channels)
+
+    def emit(timestamps, rows):
+        if writer is not None:
+            for timestamp, row in zip(timestamps, rows):
+                writer.append(row, timestamp)
+            return
+        if args.volts:
+            rows = [['{:.4f}'.format(driver.voltage_tables[channel][value]) for channel, value in zip(channels, row)]
+                    for row in rows]
+        sys.stdout.write(''.join('{},{}\n'.format(timestamp, ','.join(map(str, row))) for timestamp, row in zip(timestamps, rows)))
+
+    written = 0
+    try:
+        if len(channels) == 1 and not args.rate:
+            while not args.count or written < args.count:
+                length = min(args.burst, args.count - written) if args.count else args.burst
+                started = time.time_ns()
+                samples = driver.stream(channels[0], length, args.burst)
+                if samples is False:
+                    return 1
+                # conversions of one burst are evenly spaced between start and end of the read
+                step = (time.time_ns() - started) // length
+                emit([started + i * step for i in range(length)], [[value] for value in samples])
+                written += length
+        else:
+            period = 1.0 / args.rate if args.rate else 0.0
+            deadline = time.monotonic()
+            while not args.count or written < args.count:
+                if period:
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    deadline += period
+                reads = driver.analog_read_all_raw()
+                if reads is False:
+                    return 1
+                emit([time.time_ns()], [[reads[channel] for channel in channels]])
+                written += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer is not None:
+            writer.close()
+        sys.stdout.flush()
+
+    return 0
+
+
+def dac(args):
+    """Set DAC output to one value or play sequence of values."""
+    driver = open_driver(args)
+    if driver.i2c_bus is None:
+        return 1
+    try:
+        if len(args.values) == 1:
+            result = driver.analog_write(args.values[0])
+        else:
+            result = driver.analog_write_sequence(args.values, repeat=args.repeat or None, rate=args.rate or None)
+    except KeyboardInterrupt:
+        result = True
+    return 0 if result else 1
+
+
+def calibrate(args):
+    """Run loopback calibration of device and store it in calibration file."""
+    import calibration
+    receiver = open_driver(args)
+    if receiver.i2c_bus is None:
+        return 1
+    sources = []
+    for device in args.sources.split(','):
+        if device == '-':
+            sources.append(None)
+        else:
+            device = int(device)
+            sources.append(receiver if device == args.device else Pcf8591(
+                device & 1, device >> 1 & 1, device >> 2 & 1, args.vref, args.vagnd, bus_number=args.bus))
+
+    result = calibration.calibrate(receiver, sources, oversample=args.oversample)
+    if result is False:
+        return 1
+    try:
+        calibrations = calibration.load(args.file)
+    except IOError:
+        calibrations = {}
+    calibrations[(result.bus, result.address)] = result
+    calibration.save(args.file, calibrations)
+    for pin, channel in enumerate(result.channels):
+        if channel is not None:
+            print("AIN{} gain {:.6f} V/code offset {:+.4f} V INL {:.2f} LSB".format(pin, channel.gain, channel.offset, channel.inl))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m acquire', description="PCF8591 acquisition tool.")
+    parser.add_argument('--bus', type=int, default=bus_registry.DEFAULT_BUS, help="I2C bus number, /dev/i2c-N")
+    parser.add_argument('--device', type=int, default=0, choices=range(8), help="device index set by pins A2 A1 A0")
+    parser.add_argument('--vref', type=float, default=3.3, help="reference voltage")
+    parser.add_argument('--vagnd', type=float, default=0.0, help="analog ground voltage")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    scan_parser = commands.add_parser('scan', help="list PCF8591 devices on the bus")
+    scan_parser.add_argument('--cache', default=None, help="topology cache file reused while it matches the hardware")
+
+    sample_parser = commands.add_parser('sample', help="read samples")
+    sample_parser.add_argument('--channels', type=channel_list, default=[0, 1, 2, 3], help="comma separated AIN channels 0 to 3")
+    sample_parser.add_argument('--rate', type=float, default=0.0, help="scans per second, 0 reads as fast as possible")
+    sample_parser.add_argument('--count', type=int, default=0, help="number of samples, 0 reads until interrupted")
+    sample_parser.add_argument('--burst', type=positive_int, default=MAX_BURST_LENGTH, help="conversions per read of single channel")
+    sample_parser.add_argument('--volts', action='store_true', help="print voltages instead of raw values")
+    sample_parser.add_argument('--output', default=None, help="write raw samples to capture file instead of stdout")
+    sample_parser.add_argument('--calibration', default=None, help="calibration file applied to --volts output")
+
+    dac_parser = commands.add_parser('dac', help="set DAC output")
+    dac_parser.add_argument('values', type=int, nargs='+', help="DAC value or waveform values 0..255")
+    dac_parser.add_argument('--repeat', type=int, default=1, help="waveform repetitions, 0 loops until interrupted")
+    dac_parser.add_argument('--rate', type=float, default=0.0, help="waveform updates per second, 0 is bus speed")
+
+    calibrate_parser = commands.add_parser('calibrate', help="run DAC loopback calibration")
+    calibrate_parser.add_argument('file', help="calibration file, device entry is added or replaced")
+    calibrate_parser.add_argument('--sources', required=True, help="comma separated source device of AIN0 to AIN3, - if not wired")
+    calibrate_parser.add_argument('--oversample', type=int, default=4, help="scans averaged per DAC code")
+
+    args = parser.parse_args(argv)
+    return {'scan': scan, 'sample': sample, 'dac': dac, 'calibrate': calibrate}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
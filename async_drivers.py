@@ -0,0 +1,96 @@
+"""
+asyncio wrappers for Pcf8591 and TCA9548A drivers.
+Blocking bus calls are dispatched to a single thread executor per bus handle,
+so any number of coroutines can await readings without blocking the event loop
+and without spawning a thread per call. Calls on the same bus run in submission order.
+"""
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from pcf8591 import MAX_BURST_LENGTH
+
+_executors_lock = threading.Lock()
+_executors = weakref.WeakKeyDictionary()  # bus handle -> executor running its transactions
+
+
+def bus_executor(bus):
+    """Return executor shared by every async driver on bus, private executor if bus can not be tracked."""
+    with _executors_lock:
+        try:
+            executor = _executors.get(bus)
+            if executor is None:
+                executor = _executors[bus] = ThreadPoolExecutor(max_workers=1, thread_name_prefix='i2c')
+        except TypeError:  # None or object without weak reference support
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='i2c')
+        return executor
+
+
+class AsyncDriver(object):
+    """Common part of async wrappers -- only to be used internally."""
+
+    def __init__(self, driver):
+        """Wrap blocking driver."""
+        self.driver = driver
+        self.executor = bus_executor(driver.i2c_bus)
+
+    async def run(self, method, *args):
+        """Run blocking driver method in bus executor and return its result."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(method, *args))
+
+
+class AsyncPcf8591(AsyncDriver):
+    """Awaitable interface of Pcf8591 driver."""
+
+    async def analog_write(self, digital_value):
+        """Set voltage on pin AOUT."""
+        return await self.run(self.driver.analog_write, digital_value)
+
+    async def analog_read_raw(self, pin):
+        """Return raw discrete value read on specified pin."""
+        return await self.run(self.driver.analog_read_raw, pin)
+
+    async def analog_read_all_raw(self):
+        """Return list of raw discrete readouts on pins A0 to A4."""
+        return await self.run(self.driver.analog_read_all_raw)
+
+    async def voltage_read(self, pin):
+        """Return read voltage on specified pin."""
+        return await self.run(self.driver.voltage_read, pin)
+
+    async def voltage_read_all(self):
+        """Return list of voltage readouts on pins A0 to A4."""
+        return await self.run(self.driver.voltage_read_all)
+
+    async def stream(self, pin, block_size=MAX_BURST_LENGTH, blocks=None):
+        """Yield bytearray blocks of consecutive conversions on specified pin, forever if blocks is None."""
+        count = 0
+        while blocks is None or count < blocks:
+            samples = await self.run(self.driver.stream, pin, block_size)
+            if samples is False:
+                raise IOError("Stream read from address {} failed.".format(self.driver.i2c_address))
+            yield samples
+            count += 1
+
+
+class AsyncTCA9548A(AsyncDriver):
+    """Awaitable interface of TCA9548A driver."""
+
+    async def get_control_register(self):
+        """Read value of control register."""
+        return await self.run(self.driver.get_control_register)
+
+    async def set_control_register(self, value):
+        """Write value to control register."""
+        return await self.run(self.driver.set_control_register, value)
+
+    async def get_channel(self, ch_num):
+        """Get channel state, return 0=disabled or 1=enabled."""
+        return await self.run(self.driver.get_channel, ch_num)
+
+    async def set_channel(self, ch_num, state):
+        """Change state (0=disable, 1=enable) of a channel specified in ch_num."""
+        return await self.run(self.driver.set_channel, ch_num, state)
@@ -0,0 +1,193 @@
+"""
+Throughput and latency benchmark of driver read/write paths.
+Runs against the simulated bus by default or against a real /dev/i2c-N with --bus.
+For every API reports samples/sec, bus transactions and syscalls per sample,
+p50/p99 call latency and bytes allocated per sample, freed or not (traced in a separate pass).
+Results are written as JSON and can be compared with a baseline file, the script
+exits with status 1 when any API needs more transactions or syscalls per sample.
+Wall-clock throughput depends on the machine the baseline ran on, a drop by more than
+the tolerance is only reported as a warning unless --fail-on-throughput is given.
+
+Usage: python3 benchmark.py [--bus N] [--iterations N] [--output FILE] [--baseline FILE] [--fail-on-throughput]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+from tca9548a import TCA9548A
+
+VREF = 5.15
+VAGND = 0.0
+MUX_ADDRESS = 0x70
+STREAM_LENGTH = 256  # samples fetched by one stream call
+
+
+class CountingBus(object):
+    """Proxy counting ioctls (method calls) and bus transactions (START + address phases) of wrapped bus."""
+
+    # number of bus transactions issued by one call of SMBus method, i2c_rdwr issues one per message
+    TRANSACTIONS = {'read_byte_data': 2, 'read_i2c_block_data': 2}
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.syscalls = 0
+        self.transactions = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.bus, name)
+        transactions = self.TRANSACTIONS.get(name, 1)
+
+        def counted(*args, **kwargs):
+            self.syscalls += 1
+            self.transactions += len(args) if name == 'i2c_rdwr' else transactions
+            return method(*args, **kwargs)
+        return counted
+
+
+def percentile(sorted_values, fraction):
+    """Return value at fraction of sorted list."""
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def allocated_bytes(call, iterations):
+    """Return mean bytes allocated by one call, including memory it frees again before returning."""
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(iterations):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call()
+            total += tracemalloc.get_traced_memory()[1] - before  # peak during the call above the level before it
+    finally:
+        tracemalloc.stop()
+    return total / iterations
+
+
+def run_case(bus, call, samples_per_call, iterations):
+    """Call call iterations times, return dict of measured metrics."""
+    call()  # warm up, first call may open files or build caches
+    bus.syscalls = bus.transactions = 0
+    latencies = [0] * iterations
+    failed = 0
+
+    started = time.perf_counter_ns()
+    for i in range(iterations):
+        call_started = time.perf_counter_ns()
+        if call() is False:
+            failed += 1
+        latencies[i] = time.perf_counter_ns() - call_started
+    elapsed = time.perf_counter_ns() - started
+    transactions, syscalls = bus.transactions, bus.syscalls
+
+    samples = samples_per_call * iterations
+    latencies.sort()
+    return {
+        'samples_per_sec': samples / (elapsed / 1e9),
+        'transactions_per_sample': transactions / samples,
+        'syscalls_per_sample': syscalls / samples,
+        'p50_latency_us': percentile(latencies, 0.50) / 1e3,
+        'p99_latency_us': percentile(latencies, 0.99) / 1e3,
+        # tracing slows calls down, so allocations are measured after the timed loop
+        'allocated_bytes_per_sample': allocated_bytes(call, iterations) / samples_per_call,
+        'failed_calls': failed,
+    }
+
+
+def build_cases(bus):
+    """Return dict name -> (callable, samples per call) of benchmarked APIs."""
+    pcf = Pcf8591(0, 0, 0, VREF, VAGND, bus=bus)
+    cases = {
+        'analog_read_raw': (lambda: pcf.analog_read_raw(0), 1),
+        'analog_read_all_raw': (pcf.analog_read_all_raw, 4),
+        'voltage_read_all': (pcf.voltage_read_all, 4),
+        'analog_write': (lambda: pcf.analog_write(127), 1),
+        'stream': (lambda: pcf.stream(0, STREAM_LENGTH), STREAM_LENGTH),
+    }
+    tca = TCA9548A(MUX_ADDRESS, bus=bus)
+    cases['tca_set_channel'] = (lambda: tca.set_channel(0, 1), 1)
+    return cases
+
+
+def compare(results, baseline, tolerance):
+    """Return (regressions, slowdowns) against baseline.
+
+    regressions lists APIs that need more transactions or syscalls per sample, slowdowns lists
+    (API, relative throughput change) of APIs whose throughput dropped more than tolerance.
+    """
+    regressions = []
+    slowdowns = []
+    for name, metrics in results['apis'].items():
+        previous = baseline.get('apis', {}).get(name)
+        if not previous:
+            continue
+        # transaction and syscall counts are deterministic, any increase is a regression
+        if (metrics['transactions_per_sample'] > previous['transactions_per_sample'] + 1e-9
+                or metrics['syscalls_per_sample'] > previous['syscalls_per_sample'] + 1e-9):
+            regressions.append(name)
+        change = metrics['samples_per_sec'] / previous['samples_per_sec'] - 1
+        if change < -tolerance:
+            slowdowns.append((name, change))
+    return regressions, slowdowns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Pcf8591 and TCA9548A driver paths.")
+    parser.add_argument('--bus', type=int, default=None, help="real bus number, simulated bus is used when omitted")
+    parser.add_argument('--iterations', type=int, default=200, help="calls per API")
+    parser.add_argument('--latency', type=float, default=0.0001, help="simulated per-transaction latency in seconds")
+    parser.add_argument('--bus-speed', type=int, default=100000, help="simulated SCL frequency in Hz")
+    parser.add_argument('--output', default=None, help="write JSON results to file")
+    parser.add_argument('--baseline', default=None, help="JSON results of previous build to compare with")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="relative throughput drop reported as slowdown")
+    parser.add_argument('--fail-on-throughput', action='store_true',
+                        help="fail on slowdowns too, only meaningful when baseline ran on the same machine")
+    args = parser.parse_args(argv)
+
+    if args.bus is None:
+        bus = SimulatedSMBus(latency=args.latency, bus_speed=args.bus_speed)
+        bus.attach(DEVICE_ADDRESS << 3, SimPcf8591([1.0, 2.0, 3.0, 4.0], VREF, VAGND))
+        bus.attach(MUX_ADDRESS, SimTCA9548A())
+        backend = 'simulated'
+    else:
+        import smbus2
+        bus = smbus2.SMBus(args.bus)
+        backend = '/dev/i2c-{}'.format(args.bus)
+    counting_bus = CountingBus(bus)
+
+    results = {'backend': backend, 'iterations': args.iterations, 'apis': {}}
+    for name, (call, samples_per_call) in build_cases(counting_bus).items():
+        results['apis'][name] = run_case(counting_bus, call, samples_per_call, args.iterations)
+        print("{:<22} {:>12.0f} samples/s {:>6.3f} trans/sample {:>6.3f} syscalls/sample "
+              "p50 {:>9.1f}us p99 {:>9.1f}us".format(name, *[results['apis'][name][key] for key in (
+                  'samples_per_sec', 'transactions_per_sample', 'syscalls_per_sample', 'p50_latency_us', 'p99_latency_us')]))
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        try:
+            with open(args.baseline) as baseline_file:
+                baseline = json.load(baseline_file)
+        except (IOError, ValueError):
+            print("No usable baseline in {}, skipping comparison.".format(args.baseline))
+            return 0
+        regressions, slowdowns = compare(results, baseline, args.tolerance)
+        for name, change in slowdowns:
+            print("Warning: throughput of {} changed by {:+.0%}".format(name, change))
+        if regressions:
+            print("More bus traffic per sample in: {}".format(", ".join(regressions)))
+            return 1
+        if slowdowns and args.fail_on_throughput:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Registry of shared SMBus handles, one per physical I2C bus.
+Drivers take their handle from here instead of opening /dev/i2c-N themselves,
+the handle is closed when the last driver using it releases it.
+"""
+import threading
+import weakref
+
+from bus_stats import InstrumentedBus
+
+DEFAULT_BUS = 1  # bus number used when none is specified, /dev/i2c-1
+
+smbus2 = None  # bus backend, imported on first use so importing the drivers stays cheap and does no I/O
+
+_registry_lock = threading.Lock()
+_buses = {}  # bus number -> [SMBus handle, reference count]
+_bus_locks = weakref.WeakKeyDictionary()  # bus handle -> lock serializing its transactions
+_statistics = None  # BusStatistics recording every handle opened from now on, None disables instrumentation
+
+
+def set_statistics(statistics):
+    """Instrument handles opened after this call with statistics, None disables instrumentation of new handles."""
+    global _statistics
+    _statistics = statistics
+
+
+def backend():
+    """Return smbus2 module, import it on first call."""
+    global smbus2
+    if smbus2 is None:
+        import smbus2 as module
+        smbus2 = module
+    return smbus2
+
+
+def acquire_bus(bus_number=DEFAULT_BUS):
+    """Return shared SMBus handle for bus_number, open it on first use."""
+    with _registry_lock:
+        entry = _buses.get(bus_number)
+        if entry is None:
+            bus = backend().SMBus(bus_number)
+            if _statistics is not None:
+                bus = InstrumentedBus(bus, _statistics)
+            entry = [bus, 0]
+            _buses[bus_number] = entry
+        entry[1] += 1
+        return entry[0]
+
+
+def release_bus(bus_number=DEFAULT_BUS):
+    """Drop one reference to bus_number, close the handle when no references are left."""
+    with _registry_lock:
+        entry = _buses.get(bus_number)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del _buses[bus_number]
+            entry[0].close()
+
+
+def bus_lock(bus):
+    """Return lock shared by every driver using bus, private lock if bus can not be tracked."""
+    with _registry_lock:
+        try:
+            lock = _bus_locks.get(bus)
+            if lock is None:
+                lock = _bus_locks[bus] = threading.RLock()
+        except TypeError:  # None or object without weak reference support
+            lock = threading.RLock()
+        return lock
+
+
+def close_all():
+    """Close every open handle regardless of reference counts."""
+    with _registry_lock:
+        for bus, _ in _buses.values():
+            bus.close()
+        _buses.clear()
@@ -0,0 +1,103 @@
+"""
+Per-transaction instrumentation of I2C bus calls.
+InstrumentedBus wraps an SMBus compatible object and records count, payload bytes,
+errors and latency histogram per device address and operation type into BusStatistics.
+Nothing is wrapped unless instrumentation is requested, so disabled instrumentation costs nothing.
+Enable it for every shared handle with bus_registry.set_statistics(BusStatistics()).
+"""
+import threading
+import time
+
+HISTOGRAM_BUCKETS = 24  # bucket 0 counts calls under 1us, bucket i calls in [2**(i-1), 2**i) us, last bucket is open
+
+
+def histogram_bucket(duration_ns):
+    """Return index of log2 microsecond histogram bucket of duration."""
+    return min((max(duration_ns, 0) // 1000).bit_length(), HISTOGRAM_BUCKETS - 1)
+
+
+class BusStatistics(object):
+    """Thread-safe counters of bus operations keyed by (device address, operation)."""
+
+    def __init__(self):
+        """Init empty statistics."""
+        self.lock = threading.Lock()
+        self.operations = {}  # (address, operation) -> [count, bytes, errors, histogram]
+        self.callbacks = []
+
+    def add_callback(self, callback):
+        """Call callback(address, operation, length, latency_ns, error) after every recorded operation."""
+        self.callbacks.append(callback)
+
+    def record(self, address, operation, length, latency_ns, error):
+        """Record one bus operation -- only to be used internally."""
+        bucket = histogram_bucket(latency_ns)
+        with self.lock:
+            entry = self.operations.get((address, operation))
+            if entry is None:
+                entry = self.operations[(address, operation)] = [0, 0, 0, [0] * HISTOGRAM_BUCKETS]
+            entry[0] += 1
+            entry[1] += length
+            entry[2] += error
+            entry[3][bucket] += 1
+        for callback in self.callbacks:
+            callback(address, operation, length, latency_ns, error)
+
+    def snapshot(self):
+        """Return copy of counters as dict (address, operation) -> dict of count, bytes, errors and latency_histogram."""
+        with self.lock:
+            return dict(((key, {'count': count, 'bytes': length, 'errors': errors, 'latency_histogram': tuple(histogram)})
+                         for key, (count, length, errors, histogram) in self.operations.items()))
+
+    def reset(self):
+        """Clear all counters."""
+        with self.lock:
+            self.operations = {}
+
+
+class InstrumentedBus(object):
+    """SMBus compatible proxy recording every call into BusStatistics."""
+
+    def __init__(self, bus, statistics):
+        """Wrap bus, attributes that are not bus operations are passed through."""
+        self.bus = bus
+        self.statistics = statistics
+
+    def __getattr__(self, name):
+        return getattr(self.bus, name)
+
+    def call(self, address, operation, length, method, *args, **kwargs):
+        """Run bus method and record it -- only to be used internally."""
+        started = time.perf_counter_ns()
+        try:
+            result = method(*args, **kwargs)
+        except IOError:
+            self.statistics.record(address, operation, length, time.perf_counter_ns() - started, 1)
+            raise
+        self.statistics.record(address, operation, length, time.perf_counter_ns() - started, 0)
+        return result
+
+    """ ------------------------------- SMBus API ------------------------------- """
+    def read_byte(self, i2c_addr, force=None):
+        return self.call(i2c_addr, 'read_byte', 1, self.bus.read_byte, i2c_addr, force=force)
+
+    def write_byte(self, i2c_addr, value, force=None):
+        return self.call(i2c_addr, 'write_byte', 1, self.bus.write_byte, i2c_addr, value, force=force)
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        return self.call(i2c_addr, 'read_byte_data', 2, self.bus.read_byte_data, i2c_addr, register, force=force)
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        return self.call(i2c_addr, 'write_byte_data', 2, self.bus.write_byte_data, i2c_addr, register, value, force=force)
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        return self.call(i2c_addr, 'read_i2c_block_data', length + 1, self.bus.read_i2c_block_data,
+                         i2c_addr, register, length, force=force)
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        return self.call(i2c_addr, 'write_i2c_block_data', len(data) + 1, self.bus.write_i2c_block_data,
+                         i2c_addr, register, data, force=force)
+
+    def i2c_rdwr(self, *i2c_msgs):
+        address = i2c_msgs[0].addr if i2c_msgs else None
+        return self.call(address, 'i2c_rdwr', sum(msg.len for msg in i2c_msgs), self.bus.i2c_rdwr, *i2c_msgs)
@@ -0,0 +1,217 @@
+"""
+Loopback calibration of Pcf8591 analog inputs.
+The DAC outputs of source chips are wired to the AIN pins of a receiver chip. The sweep steps the DACs
+through their codes, every step is one combined transaction: DAC writes of all sources on the receiver's
+bus, receiver control byte and a burst read of oversample scans of AIN0 to AIN3.
+
+From the mean raw readouts and the nominal DAC voltages a per-channel gain and offset are fitted
+by least squares, the residuals give the integral non-linearity (INL) and a 256 entry correction table
+follows the measured transfer curve. The tables replace the nominal voltage table of the receiver
+(Pcf8591.set_calibration), so calibrated conversion costs the same single lookup per sample.
+Calibrations of a whole rack are stored in one JSON file keyed by bus number and device address.
+"""
+import bisect
+import collections
+import json
+import logging
+import os
+import time
+
+from pcf8591 import USING_INTERNAL_OSCILLATOR
+
+CALIBRATION_VERSION = 1
+
+# gain in volts per code and offset in volts of the fitted line, inl is largest deviation from it in LSB,
+# table is the corrected voltage of every raw code
+ChannelCalibration = collections.namedtuple('ChannelCalibration', 'gain offset inl table')
+
+
+class Calibration(object):
+    """Correction tables of the four AIN pins of one device."""
+
+    # channels has one ChannelCalibration per AIN pin, None for pins that were not calibrated
+    def __init__(self, bus, address, vref, vagnd, channels, created=None):
+        """Init calibration, vref and vagnd are the voltages the device was calibrated with."""
+        self.bus = bus
+        self.address = address
+        self.vref = vref
+        self.vagnd = vagnd
+        self.channels = list(channels)
+        self.created = time.time() if created is None else created
+
+    @property
+    def tables(self):
+        """Correction table of every AIN pin, None for pins without calibration."""
+        return [None if channel is None else channel.table for channel in self.channels]
+
+    def to_dict(self):
+        """Return JSON serializable representation."""
+        return {'bus': self.bus, 'address': self.address, 'vref': self.vref, 'vagnd': self.vagnd, 'created': self.created,
+                'channels': [None if channel is None else channel._asdict() for channel in self.channels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return Calibration from to_dict() output, raise ValueError if data is not a valid calibration."""
+        try:
+            channels = [None if channel is None else ChannelCalibration(
+                float(channel['gain']), float(channel['offset']), float(channel['inl']), [float(v) for v in channel['table']])
+                for channel in data['channels']]
+            calibration = cls(int(data['bus']), int(data['address']), float(data['vref']), float(data['vagnd']),
+                              channels, float(data['created']))
+        except (KeyError, TypeError, ValueError) as error:
+            raise ValueError("Malformed calibration: {}".format(error))
+        if len(channels) != 4 or any(channel is not None and len(channel.table) != 256 for channel in channels):
+            raise ValueError("Calibration needs 4 channels with 256 entry tables.")
+        return calibration
+
+
+def sweep(receiver, sources, codes=range(256), oversample=4):
+    """Return mean raw readout of every AIN pin of receiver for every DAC code, one list per pin, False on bus error.
+
+    sources[pin] is the Pcf8591 whose AOUT drives AIN pin, sources sharing the receiver's bus handle
+    are written in the same transaction as the read, the others with a separate write before it.
+    """
+    dac_control = receiver.set_control_byte(0, False, 0, USING_INTERNAL_OSCILLATOR)
+    scan_control = receiver.set_control_byte(0, True, 0, USING_INTERNAL_OSCILLATOR)
+    writers = []
+    for source in sources:
+        if source is not None and source not in writers:
+            writers.append(source)
+    combined = [source for source in writers if source.i2c_bus is receiver.i2c_bus]
+    separate = [source for source in writers if source.i2c_bus is not receiver.i2c_bus]
+    message = receiver.i2c_msg
+
+    means = [[] for _ in range(4)]
+    complete = False
+    with receiver.lock:
+        try:
+            for code in codes:
+                for source in separate:
+                    if not source.analog_write(code):
+                        return False
+
+                def step():
+                    writes = [message.write(source.i2c_address, [dac_control, code]) for source in combined]
+                    # first byte is the conversion started before the DAC writes, it also gives the DAC time to settle
+                    read = message.read(receiver.i2c_address, 4 * oversample + 1)
+                    receiver.i2c_bus.i2c_rdwr(*(writes + [message.write(receiver.i2c_address, [scan_control]), read]))
+                    return bytes(read)[1:]
+
+                data = receiver.guarded('calibration_sweep', step)
+                if data is False:
+                    return False
+                for pin in range(4):
+                    means[pin].append(sum(data[pin::4]) / oversample)
+            complete = True
+        finally:
+            # an aborted sweep leaves the control bytes of sources and receiver unknown
+            for source in combined:
+                source.update_pipeline(dac_control if complete else None, False)
+            receiver.update_pipeline(scan_control if complete else None, complete)
+
+    return means
+
+
+def fit_channel(measured, expected):
+    """Return ChannelCalibration fitted to mean raw readouts and expected voltages, None if they do not allow a fit."""
+    # saturated readouts do not follow the input, they say nothing about gain or linearity
+    points = sorted((raw, voltage) for raw, voltage in zip(measured, expected) if 0.5 < raw < 254.5)
+    count = len(points)
+    if count < 2:
+        return None
+    sum_raw = sum(raw for raw, _ in points)
+    sum_voltage = sum(voltage for _, voltage in points)
+    denominator = count * sum(raw * raw for raw, _ in points) - sum_raw * sum_raw
+    if denominator <= 0:
+        return None
+    gain = (count * sum(raw * voltage for raw, voltage in points) - sum_raw * sum_voltage) / denominator
+    if gain <= 0:
+        return None
+    offset = (sum_voltage - gain * sum_raw) / count
+    inl = max(abs(voltage - gain * raw - offset) for raw, voltage in points) / gain
+
+    # DAC steps finer than the ADC resolution repeat readouts, average voltages of equal readouts
+    merged = collections.OrderedDict()
+    for raw, voltage in points:
+        merged.setdefault(raw, []).append(voltage)
+    raws = list(merged)
+    voltages = [sum(values) / len(values) for values in merged.values()]
+
+    table = []
+    for code in range(256):
+        index = bisect.bisect_left(raws, code)
+        if index < len(raws) and raws[index] == code:
+            table.append(voltages[index])
+        elif 0 < index < len(raws):
+            # measured curve between the surrounding readouts
+            low, high = index - 1, index
+            table.append(voltages[low] + (code - raws[low]) * (voltages[high] - voltages[low]) / (raws[high] - raws[low]))
+        else:
+            table.append(gain * code + offset)  # outside the swept range only the fitted line is known
+
+    return ChannelCalibration(gain, offset, inl, table)
+
+
+def calibrate(receiver, sources, codes=range(256), oversample=4):
+    """Run loopback sweep and return Calibration of receiver, False on bus error.
+
+    sources[pin] is the Pcf8591 whose AOUT is wired to AIN pin of receiver (the receiver itself for
+    loopback of its own AOUT), None for pins that are not wired. DAC outputs are taken as nominal.
+    """
+    codes = list(codes)
+    means = sweep(receiver, sources, codes, oversample)
+    if means is False:
+        return False
+
+    channels = []
+    for pin, source in enumerate(sources):
+        if source is None:
+            channels.append(None)
+            continue
+        # voltage on AIN pin relative to the receiver's analog ground, as in the nominal table
+        expected = [source.agnd_voltage + source.voltage_table[code] - receiver.agnd_voltage for code in codes]
+        channels.append(fit_channel(means[pin], expected))
+    channels.extend([None] * (4 - len(channels)))
+
+    return Calibration(receiver.bus_number, receiver.i2c_address, receiver.ref_voltage, receiver.agnd_voltage, channels)
+
+
+def save(path, calibrations):
+    """Write calibrations (dict (bus, address) -> Calibration) to file, the file is replaced atomically."""
+    temporary = path + '.tmp'
+    with open(temporary, 'w') as calibration_file:
+        json.dump({'version': CALIBRATION_VERSION,
+                   'devices': [calibration.to_dict() for calibration in calibrations.values()]}, calibration_file)
+    os.replace(temporary, path)
+
+
+def load(path):
+    """Return dict (bus, address) -> Calibration read from file, raise ValueError if it is not a calibration file."""
+    with open(path) as calibration_file:
+        try:
+            data = json.load(calibration_file)
+        except ValueError as error:
+            raise ValueError("{} is not a calibration file: {}".format(path, error))
+    if not isinstance(data, dict) or data.get('version') != CALIBRATION_VERSION:
+        raise ValueError("{} is not a version {} calibration file.".format(path, CALIBRATION_VERSION))
+    calibrations = [Calibration.from_dict(device) for device in data.get('devices', [])]
+    return dict(((calibration.bus, calibration.address), calibration) for calibration in calibrations)
+
+
+def apply(drivers, calibrations):
+    """Set calibration of every driver found in calibrations, return number of calibrated drivers.
+
+    Calibrations taken with other reference or analog ground voltages than the driver uses are skipped.
+    """
+    applied = 0
+    for driver in drivers:
+        calibration = calibrations.get((driver.bus_number, driver.i2c_address))
+        if calibration is None:
+            continue
+        if abs(calibration.vref - driver.ref_voltage) > 1e-6 or abs(calibration.vagnd - driver.agnd_voltage) > 1e-6:
+            logging.warning("Calibration of device 0x{:02x} on bus {} was taken with other voltages, skipped.".format(
+                driver.i2c_address, driver.bus_number))
+            continue
+        driver.set_calibration(calibration)
+        applied += 1
+    return applied
@@ -0,0 +1,152 @@
+"""
+Compact binary capture format for long acquisitions.
+File starts with a fixed header (device address, vref/vagnd, sample rate, channel layout)
+followed by fixed size records of little endian int64 timestamp in nanoseconds and one raw byte per channel.
+CaptureWriter appends records through a preallocated buffer written out in large blocks,
+CaptureReader maps the file with mmap and exposes records as zero-copy numpy arrays or memoryviews,
+voltages are computed only for the slices that are asked for.
+"""
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b'PCFCAP\x00\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHHHddd16s')  # magic, version, header size, address, channels, vref, vagnd, rate, layout
+HEADER_SIZE = 64  # header is padded so records start on an aligned offset
+TIMESTAMP = struct.Struct('<q')
+RECORDS_PER_BLOCK = 4096  # records collected in memory before one write
+
+
+class CaptureWriter(object):
+    """Append timestamped raw records to a capture file."""
+
+    # channel_layout lists pin (or mode channel) numbers stored in every record, in record order,
+    # append=True continues existing capture with identical header instead of overwriting it
+    def __init__(self, path, address, vref, vagnd, rate=0.0, channel_layout=(0, 1, 2, 3), append=False):
+        """Create capture file or open existing one for appending."""
+        self.channels = len(channel_layout)
+        if not 0 < self.channels <= 16:
+            raise ValueError("Capture needs 1 to 16 channels.")
+        self.record_size = TIMESTAMP.size + self.channels
+        self.buffer = bytearray(self.record_size * RECORDS_PER_BLOCK)
+        self.buffered = 0  # bytes of buffer in use
+
+        if append and os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE:
+            header = read_header(path)
+            # records are converted with the header values, appending data taken with other settings would corrupt them
+            expected = {'address': address, 'vref': vref, 'vagnd': vagnd, 'rate': rate, 'channel_layout': tuple(channel_layout)}
+            mismatched = [key for key, value in expected.items() if header[key] != value]
+            if mismatched:
+                raise ValueError("Existing capture {} has different {}.".format(path, ', '.join(mismatched)))
+            self.file = open(path, 'r+b')
+            # drop partially written record left by an interrupted writer
+            records = (os.path.getsize(path) - HEADER_SIZE) // self.record_size
+            self.file.truncate(HEADER_SIZE + records * self.record_size)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(path, 'wb')
+            header = HEADER.pack(MAGIC, VERSION, HEADER_SIZE, address, self.channels, vref, vagnd, rate, bytes(channel_layout))
+            self.file.write(header.ljust(HEADER_SIZE, b'\x00'))
+
+    def append(self, raw, timestamp=None):
+        """Append one record of raw values (one per channel), timestamp in ns defaults to time.time_ns()."""
+        if len(raw) != self.channels:
+            return False
+        offset = self.buffered
+        TIMESTAMP.pack_into(self.buffer, offset, time.time_ns() if timestamp is None else timestamp)
+        self.buffer[offset + TIMESTAMP.size:offset + self.record_size] = bytes(raw)
+        self.buffered += self.record_size
+        if self.buffered == len(self.buffer):
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write buffered records to the file."""
+        if self.buffered:
+            self.file.write(memoryview(self.buffer)[:self.buffered])
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        """Flush and close capture file."""
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_header(path):
+    """Return header of capture file as dict, raise ValueError if file is not a capture."""
+    with open(path, 'rb') as capture_file:
+        data = capture_file.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError("{} is too short to be a capture.".format(path))
+    magic, version, header_size, address, channels, vref, vagnd, rate, layout = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} is not a version {} capture.".format(path, VERSION))
+    return {'header_size': header_size, 'address': address, 'channels': channels, 'vref': vref, 'vagnd': vagnd,
+            'rate': rate, 'channel_layout': tuple(layout[:channels])}
+
+
+class CaptureReader(object):
+    """Memory mapped read access to capture file."""
+
+    def __init__(self, path):
+        """Map capture file, records written after opening are not visible."""
+        self.header = read_header(path)
+        self.channels = self.header['channels']
+        self.record_size = TIMESTAMP.size + self.channels
+        step = (self.header['vref'] - self.header['vagnd']) / 255.0
+        self.voltage_table = [step * raw for raw in range(256)]
+
+        with open(path, 'rb') as capture_file:
+            self.map = mmap.mmap(capture_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self.map)[self.header['header_size']:]
+        self.count = len(self.data) // self.record_size  # partially written last record is ignored
+
+    def __len__(self):
+        return self.count
+
+    def record(self, index):
+        """Return (timestamp, raw bytes) of record at index."""
+        offset = index * self.record_size
+        return TIMESTAMP.unpack_from(self.data, offset)[0], bytes(self.data[offset + TIMESTAMP.size:offset + self.record_size])
+
+    def raw_column(self, channel):
+        """Return zero-copy strided memoryview of raw values of channel index in all records."""
+        start = TIMESTAMP.size + channel
+        return self.data[start:self.count * self.record_size:self.record_size]
+
+    def records(self):
+        """Return zero-copy numpy structured array with fields timestamp and raw (numpy required)."""
+        import numpy
+        dtype = numpy.dtype([('timestamp', '<i8'), ('raw', 'u1', (self.channels,))])
+        return numpy.frombuffer(self.data, dtype=dtype, count=self.count)
+
+    def voltages(self, start=0, stop=None):
+        """Return voltages of records start to stop, numpy array of shape (records, channels) or list of lists."""
+        stop = self.count if stop is None else min(stop, self.count)
+        try:
+            import numpy
+        except ImportError:
+            return [[self.voltage_table[raw] for raw in self.record(index)[1]] for index in range(start, stop)]
+        return numpy.array(self.voltage_table)[self.records()['raw'][start:stop]]
+
+    def close(self):
+        """Unmap file, fails with BufferError while arrays returned by reader are still alive."""
+        self.data.release()
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,68 @@
+"""
+Scan scheduler for devices sitting behind a TCA9548A I2C switch.
+Devices are grouped per mux channel and channels whose device addresses do not collide
+are enabled together, so one scan cycle needs at most one control register write per group
+instead of one per device. Devices whose circuit breaker is open are left out of the cycle,
+a group with no device left is not switched at all.
+"""
+
+
+class MuxScanScheduler(object):
+    """Read devices behind a TCA9548A with as few control register writes as possible."""
+
+    # mux is TCA9548A driver, read_method is the name of the driver method called for every device
+    def __init__(self, mux, read_method='analog_read_all_raw'):
+        """Init scheduler with no devices."""
+        self.mux = mux
+        self.read_method = read_method
+        self.channels = {}  # mux channel -> list of devices on it
+        self.groups = None  # planned (control register value, devices) list, rebuilt after topology change
+
+    def add(self, device, channel):
+        """Declare that device is connected to specified mux channel."""
+        if channel < 0 or channel >= self.mux.PORTS_COUNT:
+            return False
+        self.channels.setdefault(channel, []).append(device)
+        self.groups = None
+        return True
+
+    def plan(self):
+        """Return list of (control register value, devices), channels in one group have no colliding addresses."""
+        groups = []  # [control register value, addresses used, devices]
+        # place channels with most devices first, they are the hardest to fit
+        for channel in sorted(self.channels, key=lambda ch: (-len(self.channels[ch]), ch)):
+            devices = self.channels[channel]
+            addresses = set(device.i2c_address for device in devices)
+            for group in groups:
+                if not group[1] & addresses:
+                    group[0] |= 1 << channel
+                    group[1] |= addresses
+                    group[2].extend(devices)
+                    break
+            else:
+                groups.append([1 << channel, addresses, list(devices)])
+
+        return [(register, devices) for register, _, devices in groups]
+
+    def scan(self):
+        """Read every device once, return dict device -> reads, False for devices that could not be read."""
+        if self.groups is None:
+            self.groups = self.plan()
+        # start with the group that is already enabled, saves one switch per cycle when mux runs in shadow mode
+        if len(self.groups) > 1 and self.groups[-1][0] == self.mux.shadow_register:
+            self.groups.reverse()
+
+        results = {}
+        with self.mux.lock:  # nobody else may switch the mux in the middle of a scan
+            for register, devices in self.groups:
+                ready = []
+                for device in devices:
+                    if device.breaker is not None and device.breaker.is_open:
+                        results[device] = False
+                    else:
+                        ready.append(device)
+                switched = bool(ready) and self.mux.set_control_register(register)
+                for device in ready:
+                    results[device] = getattr(device, self.read_method)() if switched else False
+
+        return results
@@ -1,5 +1,15 @@
+import array
+import errno
 import logging
-import smbus2
+import math
+import sys
+import time
+
+import bus_registry
+import resilience
+from resilience import DeviceError
+
+numpy = None  # imported on first vectorized operation so importing the driver stays fast, False if not installed
 
 '''
 The address consists of a fixed part and a programmable part. The programmable
@@ -11,41 +21,208 @@ When using internal oscillator EXT pin must be wired to Vss
 
 DEVICE_ADDRESS = 0x09
 USING_INTERNAL_OSCILLATOR = True  # when using internal oscillator analog output enable flag should be set to True
+MAX_BURST_LENGTH = 1024  # maximum number of conversions fetched in one read transaction
+BUS_SPEED = 100000  # SCL frequency in Hz assumed for pacing DAC waveforms, I2C standard mode
+OVERSAMPLING_METHODS = ('mean', 'median')
+
+# analog input programming (analog_mode of control byte)
+SINGLE_ENDED = 0  # AIN0, AIN1, AIN2, AIN3
+DIFFERENTIAL_TO_AIN3 = 1  # AIN0-AIN3, AIN1-AIN3, AIN2-AIN3
+MIXED = 2  # AIN0, AIN1, AIN2-AIN3
+TWO_DIFFERENTIAL = 3  # AIN0-AIN1, AIN2-AIN3
+MODE_CHANNELS = ((False, False, False, False), (True, True, True), (False, False, True), (True, True))  # True for differential channel
+NO_ACK_ERRORS = (errno.ENXIO, errno.EREMOTEIO)  # errno of transfers the device did not acknowledge, depends on the adapter
+
+
+def load_numpy():
+    """Return numpy module, None if it is not installed."""
+    global numpy
+    if numpy is None:
+        try:
+            import numpy as module
+        except ImportError:
+            module = False
+        numpy = module
+    return numpy or None
 
 
 class Pcf8591(object):
     """Main class for Pcf8591 adc chip."""
 
     # A0, A1, A2 should be either 0 or 1, vref is reference voltage for analog pins, vagnd is analog ground
-    def __init__(self, A0, A1, A2, vref, vagnd):
+    # bus is an already opened SMBus compatible object, when None shared handle for bus_number is taken from bus_registry
+    # pipelined=True lets repeated reads of the same channel return the conversion the chip started at the end of
+    # the previous read with a single 1-byte read, the value is then as old as the previous read
+    # retry is resilience.RetryPolicy for failed bus operations, breaker a resilience.CircuitBreaker of this device,
+    # without them every operation is tried once, the error of the last failed operation is kept in last_error
+    def __init__(self, A0, A1, A2, vref, vagnd, bus_number=bus_registry.DEFAULT_BUS, bus=None, pipelined=False,
+                 retry=None, breaker=None):
         """Init smbus channel and Pcf8591 driver on specified address."""
+        # reference voltage and analog ground voltage are necessary for converting digital readings to voltage
+        self._ref_voltage = vref
+        self._agnd_voltage = vagnd
+        self.calibration = None  # calibration.Calibration applied to single ended reads, None for nominal conversion
+        self.build_voltage_table()
+
+        self.i2c_address = DEVICE_ADDRESS << 3 | A2 << 2 | A1 << 1 | A0
+        self.bus_number = bus_number
+        self.shared_bus = bus is None  # handle is reference counted by bus_registry
+        self.i2c_bus = None
+        self.i2c_msg = bus_registry.backend().i2c_msg  # message type of combined transactions
+        self.pipelined = pipelined
+        self.current_control_byte = None  # control byte currently in the chip, None if unknown
+        self.pending_control_byte = None  # configuration of conversion the chip sends as next first byte, None if unknown
+        self.retry = retry
+        self.breaker = breaker
+        self.last_error = None  # DeviceError of the last operation that returned False because of the bus
+
         try:
-            self.i2c_bus = smbus2.SMBus(1)
-            self.i2c_address = DEVICE_ADDRESS << 3 | A2 << 2 | A1 << 1 | A0
-            self.ref_voltage = vref  # reference voltage and analog ground voltage are necessary for converting digital readings to
-            self.agnd_voltage = vagnd
+            self.i2c_bus = bus if bus is not None else bus_registry.acquire_bus(bus_number)
 
             if (vref - vagnd < 0):
-                self.i2c_bus = None
+                self.close()
 
-        except:
-            logging.error("Bus on channel {} is not available.".format(1))
+        except IOError:
+            logging.error("Bus on channel {} is not available.".format(bus_number))
             logging.info("Available busses are listed as /dev/i2c*")
             self.i2c_bus = None
 
+        self.lock = bus_registry.bus_lock(self.i2c_bus)  # held for every transaction and the pipeline state it changes
+
+    def close(self):
+        """Release bus handle, shared handle is closed when its last user releases it."""
+        if self.i2c_bus is not None and self.shared_bus:
+            bus_registry.release_bus(self.bus_number)
+        self.i2c_bus = None
+
+    def guarded(self, operation, function):
+        """Return function() run under retry policy and circuit breaker, False if it failed -- only to be used internally."""
+        if self.i2c_bus is None:
+            self.last_error = DeviceError(self.i2c_address, operation, 0, resilience.NO_BUS)
+            return False
+
+        def attempt():
+            # no other thread may change the control byte between the pipeline check and the transfer,
+            # the lock is taken per attempt so it is not held during retry backoff
+            with self.lock:
+                try:
+                    return function()
+                except IOError:
+                    self.update_pipeline(None, False)  # chip state is unknown, next attempt selects the channel again
+                    raise
+
+        try:
+            result = resilience.call(attempt, self.i2c_address, operation, self.retry, self.breaker)
+        except DeviceError as error:
+            self.last_error = error
+            return False
+
+        self.last_error = None
+        return result
+
+    @property
+    def ref_voltage(self):
+        """Reference voltage of analog pins."""
+        return self._ref_voltage
+
+    @ref_voltage.setter
+    def ref_voltage(self, vref):
+        self._ref_voltage = vref
+        self.calibration = None  # measured with the old reference, no longer valid
+        self.build_voltage_table()
+
+    @property
+    def agnd_voltage(self):
+        """Analog ground voltage."""
+        return self._agnd_voltage
+
+    @agnd_voltage.setter
+    def agnd_voltage(self, vagnd):
+        self._agnd_voltage = vagnd
+        self.calibration = None
+        self.build_voltage_table()
+
+    def set_calibration(self, calibration):
+        """Convert single ended reads with the correction tables of calibration, None restores nominal conversion."""
+        self.calibration = calibration
+        self.build_voltage_table()
+
     """ ------------------------------- DAC ------------------------------- """
     def analog_write(self, digital_value):
         """Convert discrete value and sets voltage on pin AOUT."""
         if (digital_value < 0 or digital_value > 255):
             return False
 
-        try:
-            control_byte = self.set_control_byte(0, False, 0, USING_INTERNAL_OSCILLATOR)
+        control_byte = self.set_control_byte(0, False, 0, USING_INTERNAL_OSCILLATOR)
+
+        def write():
             # writing 2 bytes of data
             self.i2c_bus.write_byte_data(self.i2c_address, control_byte, digital_value)
-        except IOError:
+            self.update_pipeline(control_byte, False)
+            return True
+
+        return self.guarded('analog_write', write)
+
+    def analog_write_sequence(self, values, repeat=1, rate=None, burst_size=MAX_BURST_LENGTH, bus_speed=BUS_SPEED):
+        """Stream discrete values to pin AOUT, repeat times (forever if None), limited to rate updates per second if set.
+
+        Values inside one burst are clocked out at bus speed (SCL frequency in Hz). With rate set a burst
+        carries only as many values as the bus sends in their own update periods, one value per write for
+        rates well below bus speed, and the call returns after the period of the last value has passed.
+        """
+        if burst_size < 1:
             return False
+        try:
+            # an ndarray can only exist if numpy was already imported by the caller
+            if 'numpy' in sys.modules and isinstance(values, sys.modules['numpy'].ndarray):
+                if values.size and (values.min() < 0 or values.max() > 255):
+                    return False
+                data = values.astype('uint8').tobytes()
+            else:
+                data = bytes(values)  # raises ValueError if any value is outside 0..255
+        except (ValueError, TypeError):
+            return False
+
+        if rate:
+            burst_size = min(burst_size, self.paced_burst_size(rate, bus_speed))
+        control_byte = self.set_control_byte(0, False, 0, USING_INTERNAL_OSCILLATOR)
+        # every burst is control byte followed by data bytes, built once and reused on every repetition
+        bursts = [(self.i2c_msg.write(self.i2c_address, bytes([control_byte]) + data[offset:offset + burst_size]),
+                   min(burst_size, len(data) - offset)) for offset in range(0, len(data), burst_size)]
+
+        deadline = time.monotonic()
+        count = 0
+        while bursts and (repeat is None or count < repeat):
+            for message, length in bursts:
+                if rate:
+                    delay = deadline - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    deadline += length / rate
+                # a failed burst is retried on its own, the bursts already clocked out are not repeated
+                if self.guarded('analog_write_sequence', lambda: self.write_burst(message, control_byte)) is False:
+                    return False
+            count += 1
+
+        if rate:
+            # the last value stays on AOUT for its whole period before the next waveform may start
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return True
 
+    def paced_burst_size(self, rate, bus_speed):
+        """Return number of DAC values per write for rate updates per second -- only to be used internally."""
+        byte_time = 9.0 / bus_speed  # 8 data bits and acknowledge
+        if rate * byte_time >= 1:
+            return MAX_BURST_LENGTH  # bus can not keep up with rate, send as much as possible per write
+        # a write of n values also carries address and control byte, it has to fit into the n periods
+        return max(int(math.ceil(rate * 2 * byte_time / (1 - rate * byte_time))), 1)
+
+    def write_burst(self, message, control_byte):
+        """Write prepared DAC burst message, raise IOError on bus error -- only to be used internally."""
+        self.i2c_bus.i2c_rdwr(message)
+        self.update_pipeline(control_byte, False)
         return True
 
     """ ------------------------------- ADC ------------------------------- """
@@ -53,24 +230,39 @@ class Pcf8591(object):
         """Trigger ADC on selected pin"""
         control_byte = self.set_control_byte(pin, False, 0, USING_INTERNAL_OSCILLATOR)
         # writing one byte of data
-        self.i2c_bus.write_byte(self.i2c_address, control_byte)
+        with self.lock:
+            self.update_pipeline(None, False)
+            self.i2c_bus.write_byte(self.i2c_address, control_byte)
+            self.update_pipeline(control_byte, False)
 
     def disable_ADC_on_pin(self, pin):
         """Disable ADC on selected pin -- not used"""
         control_byte = self.set_control_byte(pin, False, 0, False)
         # writing one byte of data
-        self.i2c_bus.write_byte(self.i2c_address, control_byte)
+        with self.lock:
+            self.update_pipeline(None, False)
+            self.i2c_bus.write_byte(self.i2c_address, control_byte)
+            self.update_pipeline(control_byte, False)
 
     def analog_read_raw(self, pin):
         """Return raw discrete value read on specified pin -- only to be used internally."""
-        try:
-            self.trigger_ADC_on_pin(pin)
-            self.i2c_bus.read_byte(self.i2c_address)  # empty read, always returns 80h
-        except IOError:
-            return False
-
-        value = self.i2c_bus.read_byte(self.i2c_address)
         # self.disable_ADC_on_pin(pin)
+        return self.guarded('analog_read_raw', lambda: self.read_channel(pin))
+
+    def read_channel(self, pin):
+        """Return one conversion of pin, raise IOError on bus error, run under guarded() -- only to be used internally."""
+        control_byte = self.set_control_byte(pin, False, 0, USING_INTERNAL_OSCILLATOR)
+        if self.pipelined and self.pending_control_byte == control_byte:
+            # chip already holds a conversion of this channel, started at the end of previous read
+            value = self.i2c_bus.read_byte(self.i2c_address)
+        else:
+            read = self.i2c_msg.read(self.i2c_address, 2)  # first byte is previous conversion, discard it
+            if self.current_control_byte == control_byte:
+                self.i2c_bus.i2c_rdwr(read)
+            else:
+                self.i2c_bus.i2c_rdwr(self.i2c_msg.write(self.i2c_address, [control_byte]), read)
+            value = list(read)[1]
+        self.update_pipeline(control_byte, True)
         return value
 
     def analog_read_AIN0_raw(self):
@@ -89,34 +281,150 @@ class Pcf8591(object):
         """Return raw discrete value read on pin A3."""
         return self.analog_read_raw(3)
 
-    def analog_read_all_raw(self):
-        """Return list of raw discrete readouts on pins A0 to A4."""
-        try:
-            reads = []  # list of reads from all channels (4)
+    def analog_read_all_raw(self, partial=False):
+        """Return list of raw discrete readouts on pins A0 to A4.
+
+        partial=True falls back to reading the channels one by one when the scan fails,
+        channels that still can not be read are None, False is only returned when no channel was read.
+        Scan and fallback are one operation for retries and circuit breaker, there is no fallback
+        when the device did not acknowledge the scan.
+        """
+        control_byte = self.set_control_byte(0, True, 0, USING_INTERNAL_OSCILLATOR) # auto increment ad_channel, Analog output enable - must be set to True if using internal oscillator
+        if not partial:
+            return self.read_burst_raw(control_byte, 4)
+
+        def scan():
+            try:
+                return self.read_burst(control_byte, 4)
+            except IOError as error:
+                if error.errno in NO_ACK_ERRORS:
+                    raise
+                self.update_pipeline(None, False)
+            reads = []
+            for pin in range(4):
+                try:
+                    reads.append(self.read_channel(pin))
+                except IOError as error:
+                    self.update_pipeline(None, False)
+                    failure = error
+                    reads.append(None)
+            if all(value is None for value in reads):
+                raise failure
+            return reads
+
+        return self.guarded('analog_read_all_raw', scan)
+
+    def read_burst_raw(self, control_byte, count):
+        """Return count conversions read in one combined transaction, False on bus error -- only to be used internally."""
+        return self.guarded('read_burst_raw', lambda: self.read_burst(control_byte, count))
+
+    def read_burst(self, control_byte, count):
+        """Write control byte and read count conversions, raise IOError on bus error, run under guarded() -- only to be used internally."""
+        write = self.i2c_msg.write(self.i2c_address, [control_byte])
+        read = self.i2c_msg.read(self.i2c_address, count + 1)
+        self.i2c_bus.i2c_rdwr(write, read)
+        self.update_pipeline(control_byte, True)
+        return list(read)[1:]  # first byte is the previous conversion (80h after power on), discard it
+
+    def sample_into(self, buffer, pin, burst_size=MAX_BURST_LENGTH):
+        """Fill writable byte buffer with consecutive conversions on specified pin, return number of samples read.
+
+        False is returned for read-only or multi-byte buffers, burst_size below 1 and on bus error.
+        """
+        if burst_size < 1:
+            return False
+        view = memoryview(buffer)
+        if view.readonly or view.itemsize != 1:
+            return False
+        view = view.cast('B')
+        total = len(view)
 
-            control_byte = self.set_control_byte(0, True, 0, USING_INTERNAL_OSCILLATOR) # auto increment ad_channel, Analog output enable - must be set to True if using internal oscillator
+        control_byte = self.set_control_byte(pin, False, 0, USING_INTERNAL_OSCILLATOR)
+        offset = 0
+
+        def read_blocks():
+            nonlocal offset
+            while offset < total:
+                length = min(burst_size, total - offset)
+                read = self.i2c_msg.read(self.i2c_address, length + 1)
+                if self.current_control_byte != control_byte:
+                    # channel is selected only once (and again after a failed block), every further block is a plain read
+                    self.i2c_bus.i2c_rdwr(self.i2c_msg.write(self.i2c_address, [control_byte]), read)
+                else:
+                    self.i2c_bus.i2c_rdwr(read)
+                self.update_pipeline(control_byte, True)
+                # first byte of every block is a conversion started before the block, discard it to keep samples evenly spaced
+                view[offset:offset + length] = bytes(read)[1:]
+                offset += length
+            return total
+
+        # a retry continues with the block that failed
+        return self.guarded('sample_into', read_blocks)
+
+    def stream(self, pin, n, burst_size=MAX_BURST_LENGTH):
+        """Return bytearray of n consecutive raw conversions on specified pin."""
+        samples = bytearray(n)
+        if self.sample_into(samples, pin, burst_size) is False:
+            return False
 
-            self.i2c_bus.write_byte(self.i2c_address, control_byte)
-            self.i2c_bus.read_byte(self.i2c_address)  # empty read, always returns 80h
+        return samples
 
-            reads.append(self.i2c_bus.read_byte(self.i2c_address))
-            reads.append(self.i2c_bus.read_byte(self.i2c_address))
-            reads.append(self.i2c_bus.read_byte(self.i2c_address))
-            reads.append(self.i2c_bus.read_byte(self.i2c_address))
-        except IOError:
+    def analog_read_oversampled(self, pin, oversample, method='mean', extra_bits=0):
+        """Return oversample conversions on specified pin reduced to one raw value with fractional part.
+
+        method is 'mean' or 'median', extra_bits > 0 returns integer with 8 + extra_bits bits of
+        resolution and needs at least 4 ** extra_bits samples.
+        """
+        if method not in OVERSAMPLING_METHODS or oversample < 4 ** extra_bits:
+            return False
+        samples = self.stream(pin, oversample)
+        if samples is False:
             return False
 
-        return reads
+        return self.reduce_samples(samples, 1, method, extra_bits)[0]
 
-    def voltage_read(self, pin):
-        """Return read voltage on specified pin -- only to be used internally."""
-        try:
-            self.trigger_ADC_on_pin(pin)
-            self.i2c_bus.read_byte(self.i2c_address)  # empty read, always returns 80h
-        except IOError:
+    def analog_read_all_oversampled(self, oversample, method='mean', extra_bits=0):
+        """Return list of oversampled raw values on pins A0 to A4, see analog_read_oversampled."""
+        if method not in OVERSAMPLING_METHODS or oversample < 4 ** extra_bits:
+            return False
+        control_byte = self.set_control_byte(0, True, 0, USING_INTERNAL_OSCILLATOR)
+        burst = max(MAX_BURST_LENGTH // 4, 1) * 4  # every burst restarts at AIN0, keep it a multiple of 4 channels
+        samples = bytearray()
+        remaining = 4 * oversample
+        while remaining:
+            reads = self.read_burst_raw(control_byte, min(burst, remaining))
+            if reads is False:
+                return False
+            samples.extend(reads)
+            remaining -= len(reads)
+
+        return self.reduce_samples(samples, 4, method, extra_bits)
+
+    def reduce_samples(self, samples, channels, method, extra_bits):
+        """Reduce interleaved samples of channels to one value per channel -- only to be used internally."""
+        if load_numpy():
+            block = numpy.frombuffer(samples, dtype=numpy.uint8).reshape(-1, channels)
+            values = (numpy.median(block, axis=0) if method == 'median' else block.mean(axis=0)).tolist()
+        else:
+            import statistics
+            columns = [samples[channel::channels] for channel in range(channels)]
+            values = [statistics.median(column) if method == 'median' else sum(column) / len(column) for column in columns]
+
+        if extra_bits:
+            return [int(value * (1 << extra_bits)) for value in values]
+        return values
+
+    def voltage_read(self, pin, oversample=1, method='mean'):
+        """Return read voltage on specified pin, averaged over oversample conversions -- only to be used internally."""
+        if oversample > 1:
+            code = self.analog_read_oversampled(pin, oversample, method)
+            return False if code is False else self.code_to_voltage(code, pin)
+
+        value = self.analog_read_raw(pin)
+        if value is False:
             return False
 
-        return (self.ref_voltage - self.agnd_voltage) / 255.0 * self.i2c_bus.read_byte(self.i2c_address)
+        return self.voltage_tables[pin][value]
 
     def voltage_read_AIN0(self):
         """Return read voltage on pin A0."""
@@ -134,24 +442,121 @@ class Pcf8591(object):
         """Return read voltage on pin A3."""
         return self.voltage_read(3)
 
-    def voltage_read_all(self):
-        """Return list of voltage readouts on pins A0 to A4."""
-        try:
-            reads = []
+    def voltage_read_all(self, oversample=1, method='mean', partial=False):
+        """Return list of voltage readouts on pins A0 to A4, averaged over oversample scans.
 
-            control_byte = self.set_control_byte(0, True, 0, USING_INTERNAL_OSCILLATOR) # auto increment ad_channel, Analog output enable - must be set to True if using internal oscillator
+        partial=True returns None for channels that could not be read, see analog_read_all_raw.
+        """
+        if oversample > 1:
+            codes = self.analog_read_all_oversampled(oversample, method)
+            return False if codes is False else [self.code_to_voltage(code, pin) for pin, code in enumerate(codes)]
 
-            self.i2c_bus.write_byte(self.i2c_address, control_byte)
-            self.i2c_bus.read_byte(self.i2c_address)  # empty read, always returns 80h
+        reads = self.analog_read_all_raw(partial)
+        if reads is False:
+            return False
 
-            reads.append((self.ref_voltage - self.agnd_voltage) / 255.0 * self.i2c_bus.read_byte(self.i2c_address))
-            reads.append((self.ref_voltage - self.agnd_voltage) / 255.0 * self.i2c_bus.read_byte(self.i2c_address))
-            reads.append((self.ref_voltage - self.agnd_voltage) / 255.0 * self.i2c_bus.read_byte(self.i2c_address))
-            reads.append((self.ref_voltage - self.agnd_voltage) / 255.0 * self.i2c_bus.read_byte(self.i2c_address))
-        except IOError:
+        return [None if value is None else table[value] for table, value in zip(self.voltage_tables, reads)]
+
+    def analog_read_mode_raw(self, analog_mode, ad_channel):
+        """Return raw value of ad_channel in analog_mode, differential channels are signed (-128..127)."""
+        if analog_mode not in range(4) or ad_channel not in range(len(MODE_CHANNELS[analog_mode])):
+            return False
+        control_byte = self.set_control_byte(ad_channel, False, analog_mode, USING_INTERNAL_OSCILLATOR)
+        reads = self.read_burst_raw(control_byte, 1)
+        if reads is False:
+            return False
+
+        return self.signed_value(reads[0]) if MODE_CHANNELS[analog_mode][ad_channel] else reads[0]
+
+    def analog_read_mode_all_raw(self, analog_mode):
+        """Return list of raw values of all channels in analog_mode read in one transaction, differential channels are signed."""
+        if analog_mode not in range(4):
+            return False
+        control_byte = self.set_control_byte(0, True, analog_mode, USING_INTERNAL_OSCILLATOR)
+        reads = self.read_burst_raw(control_byte, len(MODE_CHANNELS[analog_mode]))
+        if reads is False:
+            return False
+
+        return [self.signed_value(value) if differential else value
+                for value, differential in zip(reads, MODE_CHANNELS[analog_mode])]
+
+    def voltage_read_mode(self, analog_mode, ad_channel):
+        """Return voltage of ad_channel in analog_mode, differential channels return signed voltage difference."""
+        value = self.analog_read_mode_raw(analog_mode, ad_channel)
+        if value is False:
+            return False
+
+        if analog_mode == SINGLE_ENDED:
+            return self.voltage_tables[ad_channel][value]
+        return self.voltage_table[value] if value >= 0 else self.differential_table[value & 0xFF]
+
+    def voltage_read_mode_all(self, analog_mode):
+        """Return list of voltages of all channels in analog_mode read in one transaction."""
+        reads = self.analog_read_mode_all_raw(analog_mode)
+        if reads is False:
             return False
 
-        return reads
+        if analog_mode == SINGLE_ENDED:
+            return [table[value] for table, value in zip(self.voltage_tables, reads)]
+        return [self.voltage_table[value] if value >= 0 else self.differential_table[value & 0xFF] for value in reads]
+
+    def update_pipeline(self, control_byte, conversion_pending):
+        """Remember control byte written to the chip and whether a conversion of it is pending -- only to be used internally."""
+        # auto increment moves the channel pointer on every read, such configuration can not be reused
+        sticky = control_byte is not None and not control_byte & 0x04
+        self.current_control_byte = control_byte if sticky else None
+        self.pending_control_byte = control_byte if sticky and conversion_pending else None
+
+    def signed_value(self, raw):
+        """Interpret raw byte of differential conversion as two's complement -- only to be used internally."""
+        return raw - 256 if raw & 0x80 else raw
+
+    """ ------------------------------- CONVERSION ------------------------------- """
+    def build_voltage_table(self):
+        """Build 256 entry raw value to voltage lookup table -- only to be used internally."""
+        step = (self._ref_voltage - self._agnd_voltage) / 255.0
+        self.voltage_table = [step * raw for raw in range(256)]
+        self.differential_table = [step * self.signed_value(raw) for raw in range(256)]  # indexed by raw byte
+        # single ended table of every AIN pin, calibrated pins get their correction table, the others share voltage_table
+        tables = self.calibration.tables if self.calibration is not None else (None,) * 4
+        self.voltage_tables = [self.voltage_table if table is None else table for table in tables]
+        self._voltage_table_array = None  # numpy copy of voltage_table, built on first use
+        self._voltage_table_arrays = [None] * 4  # numpy copies of voltage_tables
+
+    @property
+    def voltage_table_array(self):
+        """Numpy array of voltage_table, None if numpy is not installed."""
+        if self._voltage_table_array is None and load_numpy():
+            self._voltage_table_array = numpy.array(self.voltage_table)
+        return self._voltage_table_array
+
+    def channel_table_array(self, pin):
+        """Numpy array of voltage_tables[pin], None if numpy is not installed."""
+        if self._voltage_table_arrays[pin] is None and load_numpy():
+            self._voltage_table_arrays[pin] = numpy.array(self.voltage_tables[pin])
+        return self._voltage_table_arrays[pin]
+
+    def code_to_voltage(self, code, pin=None):
+        """Convert raw value with fractional part to voltage by interpolating lookup table (of pin if set)."""
+        table = self.voltage_table if pin is None else self.voltage_tables[pin]
+        low = min(int(code), 254)
+        return table[low] + (code - low) * (table[low + 1] - table[low])
+
+    def raw_to_voltage(self, raw, pin=None):
+        """Convert buffer of raw values to voltages, return numpy array if numpy is available, array('d') otherwise.
+
+        Raw values of pin are converted with its calibrated table, pin None uses the nominal voltage_table.
+        """
+        table = self.voltage_table_array if pin is None else self.channel_table_array(pin)
+        if table is not None:
+            if not isinstance(raw, numpy.ndarray):
+                try:
+                    raw = numpy.frombuffer(raw, dtype=numpy.uint8)
+                except TypeError:
+                    raw = numpy.array(raw, dtype=numpy.uint8)
+            return table[raw]
+
+        return array.array('d', map((self.voltage_table if pin is None else self.voltage_tables[pin]).__getitem__, raw))
 
     """ ------------------------------- SETS CONTROL BYTE ------------------------------- """
     def set_control_byte(self, ad_channel, auto_increment, analog_mode, analog_output):
@@ -0,0 +1,95 @@
+"""
+Background poller for many Pcf8591 devices.
+One worker thread is started per physical I2C bus, so separate buses are scanned in parallel
+while devices on the same bus are serialized through the bus lock.
+Scans are published to a latest-value table and to optional subscriber queues,
+readers never block the acquisition loop. The error of the last failed read of every device
+is kept in errors, give the drivers a circuit breaker to keep failing devices from slowing down the scan.
+"""
+import logging
+import queue
+import threading
+import time
+
+
+class Poller(object):
+    """Poll registered devices on a fixed interval, one worker per bus."""
+
+    # interval is the minimum time between two scans of the same bus in seconds,
+    # read_method is the name of the driver method called for every scan
+    def __init__(self, interval=0.0, read_method='analog_read_all_raw'):
+        """Init empty poller."""
+        self.interval = interval
+        self.read_method = read_method
+        self.latest = {}  # device -> (timestamp, reads), replaced as a whole so readers always see a complete scan
+        self.errors = {}  # device -> (timestamp, DeviceError or exception raised) of its last failed read
+        self.bus_groups = {}  # id of bus handle -> list of devices on that bus
+        self.subscribers = []
+        self.workers = []
+        self.stop_event = threading.Event()
+
+    def add(self, device):
+        """Register device, devices sharing a bus handle are polled by the same worker, devices without bus are refused."""
+        if self.workers or device.i2c_bus is None:
+            return False
+        self.bus_groups.setdefault(id(device.i2c_bus), []).append(device)
+        return True
+
+    def subscribe(self, maxsize=1024):
+        """Return queue receiving (device, timestamp, reads) tuples, scans are dropped when the queue is full."""
+        subscriber = queue.Queue(maxsize)
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def read(self, device):
+        """Return last (timestamp, reads) of device or None if it was not scanned yet."""
+        return self.latest.get(device)
+
+    def start(self):
+        """Start one worker thread per bus."""
+        if self.workers:
+            return False
+        self.stop_event.clear()
+        for devices in self.bus_groups.values():
+            worker = threading.Thread(target=self.run_bus, args=(devices,), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+        return True
+
+    def stop(self, timeout=None):
+        """Stop all workers and wait for them to finish."""
+        self.stop_event.set()
+        for worker in self.workers:
+            worker.join(timeout)
+        self.workers = []
+
+    def run_bus(self, devices):
+        """Worker loop scanning devices of one bus -- only to be used internally."""
+        readers = [(device, getattr(device, self.read_method)) for device in devices]
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            for device, read in readers:
+                try:
+                    with device.lock:
+                        reads = read()
+                except Exception as error:  # one broken device must not end polling of the whole bus
+                    logging.error("Polling device 0x{:02x} failed: {!r}".format(device.i2c_address, error))
+                    self.errors[device] = (time.time(), error)
+                    continue
+                if reads is False:
+                    self.errors[device] = (time.time(), device.last_error)
+                    continue
+                self.publish(device, time.time(), reads)
+
+            remaining = self.interval - (time.monotonic() - started)
+            if remaining > 0:
+                self.stop_event.wait(remaining)
+
+    def publish(self, device, timestamp, reads):
+        """Store scan in latest-value table and hand it to subscribers -- only to be used internally."""
+        self.latest[device] = (timestamp, reads)
+        for subscriber in self.subscribers:
+            try:
+                subscriber.put_nowait((device, timestamp, reads))
+            except queue.Full:
+                pass
@@ -0,0 +1,231 @@
+"""
+Acquisition across several I2C buses with one worker process per bus.
+Every worker owns the Pcf8591 (and TCA9548A) drivers of its bus, scans them in a loop and appends
+one record per scan to a ring buffer in multiprocessing.shared_memory. The parent process reads
+records as zero-copy views of the shared memory, nothing is pickled or copied between processes,
+so aggregate throughput scales with the number of buses instead of being limited by one interpreter.
+The record counter is published and read under a lock shared by producer and consumer, the lock
+operations are the memory barriers that make a complete record visible before its counter on weakly
+ordered CPUs (ARM). Views are not copies, after using them check overwritten() to find records
+the producer replaced in the meantime.
+
+Record layout: int64 timestamp in ns, uint64 bit mask of devices read successfully,
+then 4 raw bytes (AIN0 to AIN3) per device in the order devices were declared.
+"""
+import collections
+import contextlib
+import multiprocessing
+import struct
+import time
+from multiprocessing import shared_memory
+
+from mux_scheduler import MuxScanScheduler
+from pcf8591 import Pcf8591, load_numpy
+from tca9548a import TCA9548A
+
+# device is index 0..7 set by pins A2 A1 A0, mux_address and mux_channel locate device behind a TCA9548A
+DeviceSpec = collections.namedtuple('DeviceSpec', 'device vref vagnd mux_address mux_channel')
+DeviceSpec.__new__.__defaults__ = (None, None)
+
+COUNTER = struct.Struct('<Q')  # record counters stored at the start of shared memory
+STARTED_OFFSET = COUNTER.size  # written records are counted at offset 0, records whose write started here
+RECORDS_OFFSET = 2 * COUNTER.size
+RECORD_HEADER = struct.Struct('<qQ')  # timestamp in ns, bit mask of devices read successfully
+RING_CAPACITY = 65536  # records kept in each ring buffer
+MAX_DEVICES = 64  # one bit of validity mask per device
+
+
+class SharedRing(object):
+    """Single producer ring buffer of fixed size records in shared memory."""
+
+    # name is None to create new shared memory, name of existing block to attach to it,
+    # lock is multiprocessing.Lock shared by producer and consumer processes, None when both are one process
+    def __init__(self, record_size, capacity=RING_CAPACITY, name=None, lock=None):
+        """Create or attach ring buffer."""
+        self.record_size = record_size
+        self.capacity = capacity
+        self.lock = lock if lock is not None else contextlib.nullcontext()
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=RECORDS_OFFSET + record_size * capacity)
+        self.buffer = self.memory.buf
+        if name is None:
+            COUNTER.pack_into(self.buffer, 0, 0)
+            COUNTER.pack_into(self.buffer, STARTED_OFFSET, 0)
+
+    @property
+    def name(self):
+        """Name other processes attach to."""
+        return self.memory.name
+
+    @property
+    def write_count(self):
+        """Number of records written since creation."""
+        with self.lock:
+            return COUNTER.unpack_from(self.buffer, 0)[0]
+
+    def write(self, record):
+        """Append record, oldest record is overwritten when ring is full -- producer only."""
+        count = COUNTER.unpack_from(self.buffer, 0)[0]  # only the producer changes it, no barrier needed
+        offset = RECORDS_OFFSET + (count % self.capacity) * self.record_size
+        with self.lock:  # announce before touching the slot, so readers know its old record is going
+            COUNTER.pack_into(self.buffer, STARTED_OFFSET, count + 1)
+        self.buffer[offset:offset + self.record_size] = record
+        with self.lock:  # publish only after the record is complete
+            COUNTER.pack_into(self.buffer, 0, count + 1)
+
+    def read(self, start):
+        """Return (views, next start, lost) for records written since start.
+
+        views are zero-copy memoryviews of consecutive records (two when the range wraps), they stay valid
+        until the producer laps them, lost is number of records overwritten before they could be read.
+        The views hold records start + lost to next start.
+        """
+        end = self.write_count
+        lost = max(0, end - start - self.capacity)
+        start += lost
+        views = []
+        while start < end:
+            index = start % self.capacity
+            count = min(end - start, self.capacity - index)
+            offset = RECORDS_OFFSET + index * self.record_size
+            views.append(self.buffer[offset:offset + count * self.record_size])
+            start += count
+        return views, end, lost
+
+    def overwritten(self, start, end):
+        """Return number of records start to end the producer overwrote, or is overwriting, since they were read.
+
+        Call it after the views of a read are consumed, the records concerned are the oldest ones,
+        so the first n records of the views must be discarded.
+        """
+        with self.lock:
+            started = COUNTER.unpack_from(self.buffer, STARTED_OFFSET)[0]
+        return max(0, min(end, started - self.capacity) - start)
+
+    def close(self):
+        """Detach from shared memory, fails with BufferError while returned views are alive."""
+        self.buffer = None
+        self.memory.close()
+
+    def unlink(self):
+        """Free shared memory once every process closed it -- creator only."""
+        self.memory.unlink()
+
+
+def run_bus(bus_number, specs, ring_name, ring_lock, capacity, interval, stop_event, bus_factory):
+    """Worker process scanning devices of one bus into shared ring -- only to be used internally."""
+    bus = bus_factory(bus_number) if bus_factory is not None else None
+    drivers = []
+    schedulers = {}  # mux address -> MuxScanScheduler
+    direct = []
+    for spec in specs:
+        device = spec.device
+        driver = Pcf8591(device & 1, device >> 1 & 1, device >> 2 & 1, spec.vref, spec.vagnd, bus_number=bus_number, bus=bus)
+        drivers.append(driver)
+        if spec.mux_address is None:
+            direct.append(driver)
+            continue
+        if spec.mux_address not in schedulers:
+            schedulers[spec.mux_address] = MuxScanScheduler(TCA9548A(spec.mux_address, bus_number, bus, shadow=True))
+        schedulers[spec.mux_address].add(driver, spec.mux_channel)
+
+    ring = SharedRing(RECORD_HEADER.size + 4 * len(drivers), capacity, ring_name, ring_lock)
+    record = bytearray(ring.record_size)
+    try:
+        while not stop_event.is_set():
+            started = time.monotonic()
+            results = {}
+            for scheduler in schedulers.values():
+                results.update(scheduler.scan())
+            for driver in direct:
+                results[driver] = driver.analog_read_all_raw()
+
+            valid = 0
+            for index, driver in enumerate(drivers):
+                offset = RECORD_HEADER.size + 4 * index
+                reads = results.get(driver)
+                if reads:
+                    record[offset:offset + 4] = bytes(reads)
+                    valid |= 1 << index
+                else:
+                    record[offset:offset + 4] = b'\x00\x00\x00\x00'
+            RECORD_HEADER.pack_into(record, 0, time.time_ns(), valid)
+            ring.write(record)
+
+            remaining = interval - (time.monotonic() - started)
+            if remaining > 0:
+                stop_event.wait(remaining)
+    finally:
+        ring.close()
+        for driver in drivers:
+            driver.close()
+
+
+class MultiBusAcquisition(object):
+    """Scan devices on several buses in parallel, one worker process per bus."""
+
+    # buses is dict bus number -> list of DeviceSpec, interval is minimum time between scans of a bus in seconds,
+    # bus_factory(bus_number) may return SMBus compatible object used instead of shared handle (must be picklable)
+    def __init__(self, buses, interval=0.0, capacity=RING_CAPACITY, bus_factory=None):
+        """Init acquisition, workers are started by start()."""
+        for specs in buses.values():
+            if len(specs) > MAX_DEVICES:
+                raise ValueError("At most {} devices per bus are supported.".format(MAX_DEVICES))
+        self.buses = dict((bus_number, list(specs)) for bus_number, specs in buses.items())
+        self.interval = interval
+        self.capacity = capacity
+        self.bus_factory = bus_factory
+        self.rings = {}
+        self.read_positions = {}
+        self.last_reads = {}  # bus number -> (first, end) record positions returned by last read
+        self.processes = {}  # bus number -> worker process
+        self.stop_event = multiprocessing.Event()
+
+    def start(self):
+        """Create ring buffers and start worker processes."""
+        self.stop_event.clear()
+        for bus_number, specs in self.buses.items():
+            lock = multiprocessing.Lock()
+            ring = SharedRing(RECORD_HEADER.size + 4 * len(specs), self.capacity, lock=lock)
+            self.rings[bus_number] = ring
+            self.read_positions[bus_number] = 0
+            process = multiprocessing.Process(target=run_bus, daemon=True, args=(
+                bus_number, specs, ring.name, lock, self.capacity, self.interval, self.stop_event, self.bus_factory))
+            process.start()
+            self.processes[bus_number] = process
+
+    def read(self, bus_number):
+        """Return (views, lost) of records of bus written since previous read, see SharedRing.read.
+
+        Raise RuntimeError when the worker of the bus died and all its records were read.
+        """
+        start = self.read_positions[bus_number]
+        views, end, lost = self.rings[bus_number].read(start)
+        self.read_positions[bus_number] = end
+        self.last_reads[bus_number] = (start + lost, end)
+        process = self.processes.get(bus_number)
+        if not views and process is not None and not process.is_alive() and not self.stop_event.is_set():
+            raise RuntimeError("Worker of bus {} exited with code {}.".format(bus_number, process.exitcode))
+        return views, lost
+
+    def overwritten(self, bus_number):
+        """Return number of records at the start of the last read of bus that were overwritten while in use."""
+        first, end = self.last_reads.get(bus_number, (0, 0))
+        return self.rings[bus_number].overwritten(first, end)
+
+    def read_arrays(self, bus_number):
+        """Return (arrays, lost) like read, views are zero-copy numpy arrays with fields timestamp, valid and raw."""
+        numpy = load_numpy()
+        dtype = numpy.dtype([('timestamp', '<i8'), ('valid', '<u8'), ('raw', 'u1', (len(self.buses[bus_number]), 4))])
+        views, lost = self.read(bus_number)
+        return [numpy.frombuffer(view, dtype=dtype) for view in views], lost
+
+    def stop(self, timeout=5.0):
+        """Stop workers and free ring buffers, views returned by read must be dropped before."""
+        self.stop_event.set()
+        for process in self.processes.values():
+            process.join(timeout)
+        self.processes = {}
+        for ring in self.rings.values():
+            ring.close()
+            ring.unlink()
+        self.rings = {}
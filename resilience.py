@@ -0,0 +1,120 @@
+"""
+Error handling shared by the drivers.
+Failed bus operations are reported as DeviceError (an IOError carrying device address, operation and
+number of attempts), RetryPolicy repeats a failed operation a bounded number of times with exponential
+backoff and CircuitBreaker stops talking to a device that keeps failing, so one bad sensor does not
+cost every scan a series of bus timeouts.
+"""
+import time
+
+CIRCUIT_OPEN = "circuit breaker open"
+NO_BUS = "bus not available"
+
+
+class DeviceError(IOError):
+    """Bus operation on a device failed, attempts is 0 when it was not tried (open circuit breaker or no bus)."""
+
+    # reason is text of the last underlying IOError, CIRCUIT_OPEN or NO_BUS, error_number its errno
+    def __init__(self, address, operation, attempts, reason, error_number=None):
+        """Init error."""
+        super(DeviceError, self).__init__("{} on device 0x{:02x} failed after {} attempts: {}".format(
+            operation, address, attempts, reason))
+        self.errno = error_number
+        self.address = address
+        self.operation = operation
+        self.attempts = attempts
+        self.reason = reason
+
+    @property
+    def circuit_open(self):
+        """True if the operation was not attempted because the circuit breaker of the device is open."""
+        return self.reason == CIRCUIT_OPEN
+
+
+class RetryPolicy(object):
+    """Bounded retry with exponential backoff."""
+
+    # attempts counts the first try, backoff is the wait in seconds before the first retry,
+    # multiplied by factor for every further retry and capped at max_backoff
+    def __init__(self, attempts=3, backoff=0.001, factor=2.0, max_backoff=0.01):
+        """Init policy."""
+        if attempts < 1:
+            raise ValueError("At least one attempt is needed.")
+        self.attempts = attempts
+        self.backoff = backoff
+        self.factor = factor
+        self.max_backoff = max_backoff
+
+    def delay(self, retry):
+        """Return seconds to wait before retry number retry (1 for the first retry)."""
+        return min(self.backoff * self.factor ** (retry - 1), self.max_backoff)
+
+
+class CircuitBreaker(object):
+    """Skip a device for cooldown seconds after threshold consecutive failed operations.
+
+    When the cooldown is over one trial operation is let through, success closes the breaker,
+    failure opens it for another cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=1.0):
+        """Init closed breaker."""
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0  # consecutive failed operations
+        self.opened_at = None  # time.monotonic() when the breaker opened, None while closed
+        self.trips = 0  # number of times the breaker opened
+
+    @property
+    def is_open(self):
+        """True while operations are skipped, does not consume the trial operation."""
+        return self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown
+
+    def allow(self):
+        """Return True if an operation may be attempted now."""
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        self.opened_at = now  # trial operation, everybody else keeps waiting until it reports back
+        return True
+
+    def success(self):
+        """Report successful operation."""
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        """Report failed operation."""
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+            self.trips += 1
+
+    def reset(self):
+        """Close breaker and forget failures."""
+        self.success()
+
+
+def call(function, address, operation, retry=None, breaker=None):
+    """Return function() run under retry policy and circuit breaker, raise DeviceError when it keeps failing."""
+    if breaker is not None and not breaker.allow():
+        raise DeviceError(address, operation, 0, CIRCUIT_OPEN)
+
+    attempts = retry.attempts if retry is not None else 1
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(retry.delay(attempt))
+        try:
+            result = function()
+        except IOError as error:
+            cause = error
+            continue
+        if breaker is not None:
+            breaker.success()
+        return result
+
+    if breaker is not None:
+        breaker.failure()
+    raise DeviceError(address, operation, attempts, str(cause), cause.errno) from cause
@@ -0,0 +1,122 @@
+"""
+Fixed-rate sampling of Pcf8591 reads.
+Deadlines are computed from the start time with time.monotonic_ns, so the rate does not drift
+with the time spent reading. When the sampler falls behind, all missed periods are fetched in one
+burst read instead of being skipped, every period still gets its own sample and nominal timestamp.
+
+Samples of such a catch-up read are taken back-to-back at bus speed, not one period apart, so
+consumers that need evenly spaced samples (FFT) must not trust the nominal timestamps of them:
+their read timestamp is the estimated conversion time instead of the start of the read, and the
+overruns counter tells how many samples came from catch-up reads.
+Achieved rate, overruns and a jitter histogram (lateness of each read against its deadline) are kept.
+"""
+import time
+
+from bus_stats import HISTOGRAM_BUCKETS, histogram_bucket
+from pcf8591 import MAX_BURST_LENGTH, USING_INTERNAL_OSCILLATOR
+
+SPIN_THRESHOLD_NS = 500000  # last part of the wait is busy waited, sleep wakes up too late for it
+MODES = ('single', 'all', 'burst')
+
+
+class FixedRateSampler(object):
+    """Drive reads of one Pcf8591 at a target rate."""
+
+    # mode 'single' reads one sample of pin per period, 'all' one scan of AIN0 to AIN3,
+    # 'burst' a block of burst_size consecutive conversions of pin, rate is periods per second
+    def __init__(self, driver, rate, mode='single', pin=0, burst_size=64):
+        """Init sampler, nothing is read until run()."""
+        if mode not in MODES or rate <= 0:
+            raise ValueError("Mode must be one of {} and rate positive.".format(', '.join(MODES)))
+        self.driver = driver
+        self.period_ns = int(1e9 / rate)
+        self.mode = mode
+        self.pin = pin
+        self.burst_size = burst_size
+        # most periods fetched by one catch-up read, keeps a single transaction within MAX_BURST_LENGTH conversions
+        self.max_batch = max(MAX_BURST_LENGTH // {'single': 1, 'all': 4, 'burst': burst_size}[mode], 1)
+        self.running = False
+        self.reset_statistics()
+
+    def reset_statistics(self):
+        """Clear counters and jitter histogram."""
+        self.periods = 0  # periods delivered
+        self.reads = 0  # bus reads issued, lower than periods when reads were batched
+        self.overruns = 0  # periods fetched by catch-up reads, their samples are not evenly spaced
+        self.failed_reads = 0
+        self.jitter_histogram = [0] * HISTOGRAM_BUCKETS
+        self.elapsed_ns = 0
+
+    @property
+    def achieved_rate(self):
+        """Periods delivered per second during last run."""
+        return self.periods * 1e9 / self.elapsed_ns if self.elapsed_ns else 0.0
+
+    def read_periods(self, count):
+        """Read data of count periods in one bus read, return list with one entry per period or False."""
+        driver = self.driver
+        if self.mode == 'single':
+            samples = driver.analog_read_raw(self.pin) if count == 1 else driver.stream(self.pin, count)
+            return False if samples is False else ([samples] if count == 1 else list(samples))
+        if self.mode == 'all':
+            control_byte = driver.set_control_byte(0, True, 0, USING_INTERNAL_OSCILLATOR)
+            reads = driver.read_burst_raw(control_byte, 4 * count)
+            return False if reads is False else [reads[i:i + 4] for i in range(0, 4 * count, 4)]
+        block = driver.stream(self.pin, self.burst_size * count, MAX_BURST_LENGTH)
+        if block is False:
+            return False
+        return [block[i:i + self.burst_size] for i in range(0, len(block), self.burst_size)]
+
+    def run(self, periods=None, callback=None):
+        """Sample for periods periods (until stop() if None), return list of (deadline_ns, read_ns, data).
+
+        When callback is set it is called as callback(deadline_ns, read_ns, data) instead of collecting results,
+        deadline_ns is the nominal monotonic timestamp of the period, read_ns when its read actually started.
+        The periods after the first one of a catch-up read get the estimated time of their conversion as read_ns,
+        the read duration spread evenly over them, check read_ns - deadline_ns before relying on even spacing.
+        """
+        results = []
+        self.running = True
+        started = time.monotonic_ns()
+        next_period = 0
+        try:
+            while self.running and (periods is None or next_period < periods):
+                deadline = started + next_period * self.period_ns
+                now = time.monotonic_ns()
+                if now < deadline:
+                    if deadline - now > SPIN_THRESHOLD_NS:
+                        time.sleep((deadline - now - SPIN_THRESHOLD_NS) / 1e9)
+                    while time.monotonic_ns() < deadline:
+                        pass
+                    now = time.monotonic_ns()
+
+                # every period whose deadline already passed is fetched by this read
+                due = min((now - started) // self.period_ns + 1 - next_period, self.max_batch)
+                if periods is not None:
+                    due = min(due, periods - next_period)
+                self.overruns += due - 1
+                self.jitter_histogram[histogram_bucket(now - deadline)] += 1
+                data = self.read_periods(due)
+                duration = time.monotonic_ns() - now
+                self.reads += 1
+                if data is False:
+                    self.failed_reads += 1
+                    data = [None] * due
+
+                for index, item in enumerate(data):
+                    entry = (started + (next_period + index) * self.period_ns, now + index * duration // due, item)
+                    if callback is not None:
+                        callback(*entry)
+                    else:
+                        results.append(entry)
+                next_period += due
+                self.periods += due
+        finally:
+            self.elapsed_ns += time.monotonic_ns() - started
+            self.running = False
+
+        return results
+
+    def stop(self):
+        """Make run() return after the current read, may be called from another thread."""
+        self.running = False
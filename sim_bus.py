@@ -0,0 +1,202 @@
+"""
+In-memory simulated I2C bus with PCF8591 and TCA9548A device models.
+SimulatedSMBus implements the part of smbus2.SMBus used by the drivers, including i2c_rdwr,
+so drivers can be tested and benchmarked on machines without I2C hardware.
+Per-transaction latency, bus speed and random faults can be injected.
+"""
+import ctypes
+import errno
+import random
+import time
+
+I2C_M_RD = 0x0001  # read flag of i2c_msg, as defined in i2c.h
+PCF8591_CHANNEL_COUNT = (4, 3, 3, 2)  # number of A/D channels for analog input programming 0 to 3
+SPIN_THRESHOLD = 0.001  # delays shorter than this are busy waited, sleep is too coarse for them
+
+
+class SimPcf8591(object):
+    """Model of PCF8591 ADC/DAC."""
+
+    # inputs are voltages on AIN0 to AIN3, either numbers or callables returning voltage
+    def __init__(self, inputs=(0.0, 0.0, 0.0, 0.0), vref=5.0, vagnd=0.0):
+        """Init chip in power on state."""
+        self.inputs = list(inputs)
+        self.vref = vref
+        self.vagnd = vagnd
+        self.control_byte = 0x00
+        self.channel = 0
+        self.dac_value = 0
+        self.last_conversion = 0x80  # result transmitted as first byte of next read, 80h after power on
+
+    @property
+    def dac_voltage(self):
+        """Voltage on pin AOUT, analog ground when analog output is disabled."""
+        if not self.control_byte & 0x40:
+            return self.vagnd
+        return self.vagnd + (self.vref - self.vagnd) * self.dac_value / 255.0
+
+    def input_voltage(self, pin):
+        """Return voltage currently applied to AIN pin."""
+        voltage = self.inputs[pin]
+        return voltage() if callable(voltage) else voltage
+
+    def single_ended(self, pin):
+        """Return code of single ended conversion of pin."""
+        code = int(round((self.input_voltage(pin) - self.vagnd) / (self.vref - self.vagnd) * 255))
+        return min(max(code, 0), 255)
+
+    def differential(self, positive, negative):
+        """Return two's complement code of differential conversion between two pins."""
+        code = int(round((self.input_voltage(positive) - self.input_voltage(negative)) / (self.vref - self.vagnd) * 255))
+        return min(max(code, -128), 127) & 0xFF
+
+    def convert(self):
+        """Convert currently selected channel according to analog input programming."""
+        mode = (self.control_byte >> 4) & 3
+        channel = self.channel
+        if mode == 0:
+            return self.single_ended(channel)
+        if mode == 1:
+            return self.differential(channel, 3)
+        if mode == 2:
+            return self.single_ended(channel) if channel < 2 else self.differential(2, 3)
+        return self.differential(0, 1) if channel == 0 else self.differential(2, 3)
+
+    def write(self, data):
+        """Handle write transaction, first byte is control byte, following bytes go to DAC register."""
+        if not data:
+            return
+        self.control_byte = data[0]
+        self.channel = (data[0] & 3) % PCF8591_CHANNEL_COUNT[(data[0] >> 4) & 3]
+        for value in data[1:]:
+            self.dac_value = value
+
+    def read(self, length):
+        """Handle read transaction, every byte transmits previous conversion and starts a new one."""
+        data = bytearray(length)
+        channel_count = PCF8591_CHANNEL_COUNT[(self.control_byte >> 4) & 3]
+        for i in range(length):
+            data[i] = self.last_conversion
+            self.last_conversion = self.convert()
+            if self.control_byte & 0x04:
+                self.channel = (self.channel + 1) % channel_count
+        return bytes(data)
+
+
+class SimTCA9548A(object):
+    """Model of TCA9548A I2C switch, devices behind it are reachable only while their channel is enabled."""
+
+    def __init__(self):
+        """Init switch with all channels disabled."""
+        self.PORTS_COUNT = 8
+        self.register = 0x00
+        self.channels = [{} for _ in range(self.PORTS_COUNT)]  # per channel: address -> device
+
+    def attach(self, channel, address, device):
+        """Connect device model on specified channel."""
+        self.channels[channel][address] = device
+        return device
+
+    def write(self, data):
+        """Handle write transaction, last byte written ends up in control register."""
+        if data:
+            self.register = data[-1]
+
+    def read(self, length):
+        """Handle read transaction, control register is returned for every byte."""
+        return bytes([self.register]) * length
+
+
+class SimulatedSMBus(object):
+    """SMBus compatible object backed by device models."""
+
+    # latency is added to every transaction in seconds, bus_speed is SCL frequency in Hz used to time
+    # every transferred byte (9 clocks), fault_rate is probability of a transaction failing with IOError
+    def __init__(self, latency=0.0, bus_speed=None, fault_rate=0.0, seed=None):
+        """Init empty bus."""
+        self.devices = {}  # address -> device model directly on the bus
+        self.latency = latency
+        self.byte_time = 9.0 / bus_speed if bus_speed else 0.0
+        self.fault_rate = fault_rate
+        self.random = random.Random(seed)
+        self.transactions = 0
+        self.bytes_transferred = 0
+
+    def attach(self, address, device):
+        """Connect device model directly on the bus."""
+        self.devices[address] = device
+        return device
+
+    def reachable(self, devices):
+        """Yield (address, device) of every device currently reachable from devices -- only to be used internally."""
+        for address, device in devices.items():
+            yield address, device
+            if isinstance(device, SimTCA9548A):
+                for channel in range(device.PORTS_COUNT):
+                    if device.register >> channel & 1:
+                        for item in self.reachable(device.channels[channel]):
+                            yield item
+
+    def resolve(self, address):
+        """Return device answering on address, raise IOError on no answer or address collision."""
+        found = [device for device_address, device in self.reachable(self.devices) if device_address == address]
+        if not found:
+            raise IOError(errno.EREMOTEIO, "No device on address {}".format(address))
+        if len(found) > 1:
+            raise IOError(errno.EIO, "Address collision on address {}".format(address))
+        return found[0]
+
+    def transaction(self, length):
+        """Account one transaction of length bytes including address bytes, apply delay and fault injection."""
+        self.transactions += 1
+        self.bytes_transferred += length
+        delay = self.latency + self.byte_time * length
+        if delay > SPIN_THRESHOLD:
+            time.sleep(delay)
+        elif delay > 0:
+            deadline = time.perf_counter() + delay
+            while time.perf_counter() < deadline:
+                pass
+        if self.fault_rate and self.random.random() < self.fault_rate:
+            raise IOError(errno.EIO, "Injected bus fault")
+
+    """ ------------------------------- SMBus API ------------------------------- """
+    def read_byte(self, i2c_addr, force=None):
+        self.transaction(2)
+        return self.resolve(i2c_addr).read(1)[0]
+
+    def write_byte(self, i2c_addr, value, force=None):
+        self.transaction(2)
+        self.resolve(i2c_addr).write(bytes([value]))
+
+    def read_byte_data(self, i2c_addr, register, force=None):
+        self.transaction(4)
+        device = self.resolve(i2c_addr)
+        device.write(bytes([register]))
+        return device.read(1)[0]
+
+    def write_byte_data(self, i2c_addr, register, value, force=None):
+        self.transaction(3)
+        self.resolve(i2c_addr).write(bytes([register, value]))
+
+    def read_i2c_block_data(self, i2c_addr, register, length, force=None):
+        self.transaction(length + 3)
+        device = self.resolve(i2c_addr)
+        device.write(bytes([register]))
+        return list(device.read(length))
+
+    def write_i2c_block_data(self, i2c_addr, register, data, force=None):
+        self.transaction(len(data) + 2)
+        self.resolve(i2c_addr).write(bytes([register]) + bytes(data))
+
+    def i2c_rdwr(self, *i2c_msgs):
+        self.transaction(sum(msg.len + 1 for msg in i2c_msgs))
+        for msg in i2c_msgs:
+            device = self.resolve(msg.addr)
+            if msg.flags & I2C_M_RD:
+                ctypes.memmove(msg.buf, device.read(msg.len), msg.len)
+            else:
+                device.write(ctypes.string_at(msg.buf, msg.len))
+
+    def close(self):
+        pass
@@ -6,36 +6,61 @@ Manual: tca9548.pdf
 Copyright (C) 2019 Vid Rajtmajer <vid@irnas.eu>
 """
 import logging
-import smbus
 
-from src.constants import I2C_CHANNEL
+import bus_registry
+import resilience
+from resilience import DeviceError
+
+I2C_CHANNEL = bus_registry.DEFAULT_BUS
 
 
 class TCA9548A(object):
-    def __init__(self, address):
-        """Init smbus channel and tca driver on specified address."""
+    # shadow=True keeps last known control register value in memory, reads are served from it
+    # and writes that would not change it are skipped, resync() rereads the hardware,
+    # retry is resilience.RetryPolicy for failed register accesses, the last error is kept in last_error
+    def __init__(self, address, bus_number=I2C_CHANNEL, bus=None, shadow=False, retry=None):
+        """Init smbus channel and tca driver on specified address, bus overrides the shared handle of bus_number."""
+        self.PORTS_COUNT = 8     # number of switches
+        self.i2c_address = address
+        self.shadow = shadow
+        self.shadow_register = None  # last value read from or written to control register, None if unknown
+        self.bus_number = bus_number
+        self.shared_bus = bus is None  # handle is reference counted by bus_registry
+        self.i2c_bus = None
+        self.retry = retry
+        self.last_error = None  # DeviceError of the last failed register access
         try:
-            self.PORTS_COUNT = 8     # number of switches
-
-            self.i2c_bus = smbus.SMBus(I2C_CHANNEL)
-            self.i2c_address = address
+            self.i2c_bus = bus if bus is not None else bus_registry.acquire_bus(bus_number)
             if self.get_control_register() is None:
                 raise ValueError
         except ValueError:
             logging.error("No device found on specified address!")
-            self.i2c_bus = None
-        except:
-            logging.error("Bus on channel {} is not available.".format(I2C_CHANNEL))
+            self.close()
+        except IOError:
+            logging.error("Bus on channel {} is not available.".format(bus_number))
             logging.info("Available busses are listed as /dev/i2c*")
             self.i2c_bus = None
+        self.lock = bus_registry.bus_lock(self.i2c_bus)  # held for read-modify-write of control register
 
     def get_control_register(self):
         """Read value (length: 1 byte) from control register."""
+        if self.shadow and self.shadow_register is not None:
+            return self.shadow_register
+        if self.i2c_bus is None:
+            return None
         try:
-            value = self.i2c_bus.read_byte(self.i2c_address)
-            return value
-        except:
+            value = resilience.call(lambda: self.i2c_bus.read_byte(self.i2c_address), self.i2c_address,
+                                    'get_control_register', self.retry)
+        except DeviceError as error:
+            self.last_error = error
             return None
+        self.shadow_register = value
+        return value
+
+    def resync(self):
+        """Drop cached control register value and read it from the device again."""
+        self.shadow_register = None
+        return self.get_control_register()
 
     def get_channel(self, ch_num):
         """Get channel state (specified with ch_num), return 0=disabled or 1=enabled."""
@@ -49,13 +74,21 @@ class TCA9548A(object):
 
     def set_control_register(self, value):
         """Write value (length: 1 byte) to control register."""
-        try:
-            if value < 0 or value > 255:
-                return False
-            self.i2c_bus.write_byte(self.i2c_address, value)
+        if value < 0 or value > 255:
+            return False
+        if self.shadow and value == self.shadow_register:
             return True
-        except:
+        if self.i2c_bus is None:
+            return False
+        try:
+            resilience.call(lambda: self.i2c_bus.write_byte(self.i2c_address, value), self.i2c_address,
+                            'set_control_register', self.retry)
+        except DeviceError as error:
+            self.last_error = error
+            self.shadow_register = None  # state of the device is unknown after a failed write
             return False
+        self.shadow_register = value
+        return True
 
     def set_channel(self, ch_num, state):
         """Change state (0=disable, 1=enable) of a channel specified in ch_num."""
@@ -63,30 +96,36 @@ class TCA9548A(object):
             return False
         if state != 0 and state != 1:
             return False
-        current_value = self.get_control_register()
-        if current_value is None:
-            return False
-        if state:
-            new_value = current_value | 1 << ch_num
-        else:
-            new_value = current_value & (255 - (1 << ch_num))
-        return_value = self.set_control_register(new_value)
+        with self.lock:
+            current_value = self.get_control_register()
+            if current_value is None:
+                return False
+            if state:
+                new_value = current_value | 1 << ch_num
+            else:
+                new_value = current_value & (255 - (1 << ch_num))
+            return_value = self.set_control_register(new_value)
         return return_value
 
+    def close(self):
+        """Release bus handle, shared handle is closed when its last user releases it."""
+        if self.i2c_bus is not None and self.shared_bus:
+            bus_registry.release_bus(self.bus_number)
+        self.i2c_bus = None
+
     def __del__(self):
         """Driver destructor."""
-        self.i2c_bus = None
+        self.close()
 
 
 
-# ------------------------ Test code ----------------------------
-tca = TCA9548A(0x70)
-print(bin(tca.get_control_register()))
-num = int("00001000", 2)
-tca.set_control_register(num)    # enable all connected devices
-print(bin(tca.get_control_register()))
-'''
-# tca.set_control_register(0)     # disable all channels
-# tca.set_channel(6, 1)    # enable extender
-# print(tca.get_channel(4))
-'''
+if __name__ == '__main__':
+    # ------------------------ Test code ----------------------------
+    tca = TCA9548A(0x70)
+    print(bin(tca.get_control_register()))
+    num = int("00001000", 2)
+    tca.set_control_register(num)    # enable all connected devices
+    print(bin(tca.get_control_register()))
+    # tca.set_control_register(0)     # disable all channels
+    # tca.set_channel(6, 1)    # enable extender
+    # print(tca.get_channel(4))
@@ -0,0 +1,90 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import types
+import unittest
+
+import smbus2
+
+import acquire
+import bus_registry
+from capture import CaptureReader
+from pcf8591 import DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+
+BUS = 3
+MUX_ADDRESS = 0x70
+
+VREF = 5.1
+VAGND = 0.0
+
+
+class TestAcquire(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedSMBus()
+        self.chip = self.bus.attach(DEVICE_ADDRESS << 3, SimPcf8591([0.0, 1.0, 2.55, VREF], VREF, VAGND))
+        mux = self.bus.attach(MUX_ADDRESS, SimTCA9548A())
+        mux.attach(6, DEVICE_ADDRESS << 3 | 2, SimPcf8591([1.0] * 4, VREF, VAGND))
+        # registry opens the simulated bus instead of /dev/i2c-N
+        self.saved_backend = bus_registry.smbus2
+        bus_registry.smbus2 = types.SimpleNamespace(SMBus=lambda bus_number: self.bus, i2c_msg=smbus2.i2c_msg)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        bus_registry.close_all()
+        bus_registry.smbus2 = self.saved_backend
+        shutil.rmtree(self.directory)
+
+    def run_main(self, *argv):
+        """Return (exit status, stdout lines) of acquire.main."""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = acquire.main(['--bus', str(BUS), '--vref', str(VREF)] + list(argv))
+        return status, output.getvalue().splitlines()
+
+    def test_sample_scan(self):
+        status, lines = self.run_main('sample', '--channels', '3,0,2', '--rate', '1000', '--count', '3')
+        self.assertEqual(status, 0, "Sampling should succeed")
+        self.assertEqual([line.split(',', 1)[1] for line in lines], ['255,0,128'] * 3, "Wrong channels printed")
+
+    def test_sample_stream_volts(self):
+        status, lines = self.run_main('sample', '--channels', '1', '--count', '5', '--burst', '2', '--volts')
+        self.assertEqual(status, 0, "Sampling should succeed")
+        self.assertEqual([line.split(',')[1] for line in lines], ['1.0000'] * 5, "Wrong voltages printed")
+
+    def test_sample_capture(self):
+        path = os.path.join(self.directory, 'capture.bin')
+        self.assertEqual(self.run_main('sample', '--count', '4', '--rate', '1000', '--output', path), (0, []),
+                         "Capture should be written instead of stdout")
+        with CaptureReader(path) as reader:
+            self.assertEqual(reader.record(3)[1], bytes([0, 50, 128, 255]), "Wrong record captured")
+
+    def test_sample_bad_channel(self):
+        for channels in ('4', '0,5', 'a'):
+            with self.subTest(channels=channels):
+                with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                    self.run_main('sample', '--channels', channels)
+
+    def test_sample_bad_burst(self):
+        for burst in ('0', '-3', 'x'):
+            with self.subTest(burst=burst):
+                with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                    self.run_main('sample', '--channels', '0', '--burst', burst, '--count', '5')
+
+    def test_dac(self):
+        self.assertEqual(self.run_main('dac', '200')[0], 0, "DAC write should succeed")
+        self.assertEqual(self.chip.dac_value, 200, "DAC register should be set")
+        self.assertEqual(self.run_main('dac', '1', '2', '3', '--repeat', '2')[0], 0, "Waveform should be played")
+        self.assertEqual(self.chip.dac_value, 3, "Last waveform value should remain")
+
+    def test_scan(self):
+        status, lines = self.run_main('scan')
+        self.assertEqual(status, 0, "Devices should be found")
+        self.assertEqual(lines, ['0x48 device 0', '0x4a device 2 mux 0x70 channel 6'], "Wrong devices listed")
+
+
+if __name__ == '__main__':
+    unittest.main()
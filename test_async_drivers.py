@@ -0,0 +1,83 @@
+import asyncio
+import threading
+import unittest
+
+from async_drivers import AsyncPcf8591, AsyncTCA9548A
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+from tca9548a import TCA9548A
+
+MUX_ADDRESS = 0x70
+
+VREF = 5.1
+VAGND = 0.0
+
+
+class TestAsyncDrivers(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedSMBus()
+        self.chips = [self.bus.attach(DEVICE_ADDRESS << 3 | device, SimPcf8591([1.0 * (device + 1)] * 4, VREF, VAGND))
+                      for device in range(2)]
+        self.mux = self.bus.attach(MUX_ADDRESS, SimTCA9548A())
+        self.drivers = [AsyncPcf8591(Pcf8591(device, 0, 0, VREF, VAGND, bus=self.bus)) for device in range(2)]
+
+    def test_gather_reads(self):
+        async def read():
+            return await asyncio.gather(self.drivers[0].analog_read_raw(0), self.drivers[1].analog_read_all_raw(),
+                                        self.drivers[0].voltage_read(1), self.drivers[1].voltage_read_all())
+
+        raw, reads, voltage, voltages = asyncio.run(read())
+        self.assertEqual((raw, reads), (50, [100] * 4), "Wrong raw readouts")
+        self.assertAlmostEqual(voltage, 1.0, msg="Wrong voltage")
+        self.assertAlmostEqual(voltages[3], 2.0, msg="Wrong voltages")
+
+    def test_shared_executor_in_order(self):
+        other_bus = AsyncPcf8591(Pcf8591(0, 0, 0, VREF, VAGND, bus=SimulatedSMBus()))
+        self.assertIs(self.drivers[0].executor, self.drivers[1].executor, "Drivers on one bus should share executor")
+        self.assertIsNot(self.drivers[0].executor, other_bus.executor, "Other bus should have own executor")
+
+        calls = []
+
+        def record(index):
+            calls.append((index, threading.current_thread().name))
+
+        async def submit():
+            await asyncio.gather(*(self.drivers[index % 2].run(record, index) for index in range(50)))
+
+        asyncio.run(submit())
+        self.assertEqual([index for index, _ in calls], list(range(50)), "Calls should run in submission order")
+        self.assertEqual(len(set(name for _, name in calls)), 1, "Calls of one bus should run in one thread")
+
+    def test_analog_write(self):
+        self.assertTrue(asyncio.run(self.drivers[1].analog_write(200)), "Write should succeed")
+        self.assertEqual(self.chips[1].dac_value, 200, "DAC register should be set")
+
+    def test_stream(self):
+        async def collect():
+            return [bytes(block) async for block in self.drivers[0].stream(2, block_size=8, blocks=3)]
+
+        self.assertEqual(asyncio.run(collect()), [bytes([50] * 8)] * 3, "Three blocks should be streamed")
+
+    def test_stream_failure(self):
+        del self.bus.devices[DEVICE_ADDRESS << 3]
+
+        async def collect():
+            return [block async for block in self.drivers[0].stream(2, block_size=8, blocks=1)]
+
+        with self.assertRaises(IOError):
+            asyncio.run(collect())
+
+    def test_mux(self):
+        mux = AsyncTCA9548A(TCA9548A(MUX_ADDRESS, bus=self.bus))
+
+        async def switch():
+            await mux.set_channel(4, 1)
+            return await asyncio.gather(mux.get_channel(4), mux.get_control_register())
+
+        self.assertEqual(asyncio.run(switch()), [1, 0x10], "Channel 4 should be enabled")
+        self.assertIs(mux.executor, self.drivers[0].executor, "Mux on the same bus should share executor")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from benchmark import CountingBus, compare, main, run_case
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591
+
+VREF = 5.1
+VAGND = 0.0
+
+
+def results(samples_per_sec, transactions, syscalls):
+    return {'apis': {'analog_read_raw': {'samples_per_sec': samples_per_sec, 'transactions_per_sample': transactions,
+                                         'syscalls_per_sample': syscalls}}}
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_counting_bus(self):
+        bus = SimulatedSMBus()
+        bus.attach(DEVICE_ADDRESS << 3, SimPcf8591([1.0] * 4, VREF, VAGND))
+        counting = CountingBus(bus)
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=counting)
+        driver.analog_read_raw(0)  # control byte write and read in one i2c_rdwr
+        counting.read_byte_data(DEVICE_ADDRESS << 3, 0x40)
+        self.assertEqual((counting.syscalls, counting.transactions), (2, 4), "Wrong syscall or transaction count")
+
+    def test_allocations_counted_when_freed(self):
+        metrics = run_case(CountingBus(SimulatedSMBus()), lambda: len(bytearray(4000)), 2, 10)
+        self.assertGreaterEqual(metrics['allocated_bytes_per_sample'], 2000, "Temporary buffer should count as allocated")
+        bus = SimulatedSMBus()
+        bus.attach(DEVICE_ADDRESS << 3, SimPcf8591([1.0] * 4, VREF, VAGND))
+        counting = CountingBus(bus)
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=counting)
+        metrics = run_case(counting, lambda: driver.analog_read_raw(0), 1, 10)
+        self.assertEqual(metrics['transactions_per_sample'], 1, "Allocation pass should not count as bus traffic")
+
+    def test_compare_traffic_regression(self):
+        regressions, slowdowns = compare(results(1000, 1.5, 1.0), results(1000, 1.0, 1.0), 0.25)
+        self.assertEqual((regressions, slowdowns), (['analog_read_raw'], []), "More transactions should be a regression")
+        regressions, _ = compare(results(1000, 1.0, 2.0), results(1000, 1.0, 1.0), 0.25)
+        self.assertEqual(regressions, ['analog_read_raw'], "More syscalls should be a regression")
+
+    def test_compare_slowdown_is_not_regression(self):
+        regressions, slowdowns = compare(results(500, 1.0, 1.0), results(1000, 1.0, 1.0), 0.25)
+        self.assertEqual(regressions, [], "Throughput drop alone should not be a regression")
+        self.assertEqual(slowdowns, [('analog_read_raw', -0.5)], "Throughput drop should be reported")
+        self.assertEqual(compare(results(800, 1.0, 1.0), results(1000, 1.0, 1.0), 0.25), ([], []),
+                         "Drop within tolerance should not be reported")
+
+    def test_compare_new_api(self):
+        self.assertEqual(compare(results(1, 9.0, 9.0), {'apis': {}}, 0.25), ([], []), "API without baseline should be skipped")
+
+    def test_missing_baseline(self):
+        self.assertEqual(main(['--iterations', '2', '--latency', '0', '--baseline', '/nonexistent/benchmark.json']), 0,
+                         "Missing baseline should not fail the build")
+
+
+if __name__ == '__main__':
+    unittest.main()
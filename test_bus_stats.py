@@ -0,0 +1,48 @@
+import unittest
+
+from bus_stats import BusStatistics, InstrumentedBus
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591
+
+VREF = 5.15
+VAGND = 0.0
+
+ADDRESS = DEVICE_ADDRESS << 3  # A0=0, A1=0, A2=0
+
+
+class TestBusStatistics(unittest.TestCase):
+
+    def setUp(self):
+        self.statistics = BusStatistics()
+        self.sim = SimulatedSMBus()
+        self.sim.attach(ADDRESS, SimPcf8591())
+        self.driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=InstrumentedBus(self.sim, self.statistics))
+
+    def test_count_and_bytes(self):
+        self.driver.analog_read_all_raw()
+        self.driver.analog_read_all_raw()
+        operation = self.statistics.snapshot()[(ADDRESS, 'i2c_rdwr')]
+        self.assertEqual(operation['count'], 2, "Two scans should be recorded")
+        self.assertEqual(operation['bytes'], 12, "Each scan transfers control byte and 5 read bytes")
+        self.assertEqual(sum(operation['latency_histogram']), 2, "Every operation should land in histogram")
+
+    def test_errors(self):
+        driver = Pcf8591(1, 0, 0, VREF, VAGND, bus=self.driver.i2c_bus)
+        driver.analog_write(10)
+        self.assertEqual(self.statistics.snapshot()[(ADDRESS | 1, 'write_byte_data')]['errors'], 1, "Failed write should be counted")
+
+    def test_callback(self):
+        operations = []
+        self.statistics.add_callback(lambda address, operation, length, latency_ns, error: operations.append(operation))
+        self.driver.analog_write(10)
+        self.driver.analog_read_raw(0)
+        self.assertEqual(operations, ['write_byte_data', 'i2c_rdwr'], "Callback should see every operation")
+
+    def test_reset(self):
+        self.driver.analog_write(10)
+        self.statistics.reset()
+        self.assertEqual(self.statistics.snapshot(), {}, "Reset should clear all counters")
+
+
+if __name__ == '__main__':
+    unittest.main()
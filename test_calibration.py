@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import calibration
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591
+from test_resilience import FlakyBus
+
+VREF = 5.1
+VAGND = 0.0
+
+
+def distorted(source, gain, offset, square=0.0):
+    """Voltage seen by the receiver's converter for the DAC voltage of source."""
+    return lambda: gain * source.dac_voltage + offset + square * source.dac_voltage ** 2
+
+
+class TestCalibration(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FlakyBus()
+        self.chips = [self.bus.attach(DEVICE_ADDRESS << 3 | device, SimPcf8591([0.0] * 4, VREF, VAGND)) for device in range(1, 5)]
+        # AIN0 to AIN2 have gain and offset errors, AIN3 is bent
+        self.bus.attach(DEVICE_ADDRESS << 3, SimPcf8591([distorted(self.chips[0], 0.9, 0.1), distorted(self.chips[1], 1.05, -0.05),
+                                                         distorted(self.chips[2], 1.0, 0.2), distorted(self.chips[3], 0.9, 0.0, 0.02)],
+                                                        VREF, VAGND))
+        self.receiver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus)
+        self.sources = [Pcf8591(device & 1, device >> 1 & 1, device >> 2 & 1, VREF, VAGND, bus=self.bus) for device in range(1, 5)]
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_sweep_one_transaction_per_step(self):
+        means = calibration.sweep(self.receiver, self.sources, range(0, 256, 5), oversample=4)
+        self.assertEqual(self.bus.transactions, 52, "Every step should be one combined transaction")
+        self.assertEqual(means[2][0], 10.0, "0.2V offset on AIN2 should read 10 at DAC code 0")
+
+    def test_failed_sweep_invalidates_pipeline(self):
+        self.chips[0].inputs = [0.0, 0.0, 2.0, 0.0]
+        source = Pcf8591(1, 0, 0, VREF, VAGND, bus=self.bus, pipelined=True)
+        self.sources[0] = source
+        source.analog_read_raw(2)
+        self.assertEqual(source.analog_read_raw(2), 100, "Pipelined read of AIN2 should read 2.0V")
+        self.bus.failing = {self.bus.transactions + 3}  # third step of the sweep
+        self.assertEqual(calibration.sweep(self.receiver, self.sources, range(0, 256, 5)), False, "Sweep should fail")
+        self.assertEqual([source.analog_read_raw(2) for _ in range(2)], [100, 100],
+                         "Source should select AIN2 again after the aborted sweep")
+
+    def test_calibrated_read(self):
+        result = calibration.calibrate(self.receiver, self.sources)
+        self.assertAlmostEqual(result.channels[0].gain, VREF / 255 / 0.9, delta=0.001, msg="Wrong gain of AIN0")
+        self.assertGreater(result.channels[3].inl, 1.0, "Bent AIN3 should show non-linearity")
+        self.receiver.set_calibration(result)
+        for code in (30, 128, 200):
+            for source in self.sources:
+                source.analog_write(code)
+            expected = [chip.dac_voltage for chip in self.chips]
+            for pin, voltage in enumerate(self.receiver.voltage_read_all()):
+                with self.subTest(code=code, pin=pin):
+                    self.assertAlmostEqual(voltage, expected[pin], delta=0.025, msg="Calibrated voltage should match DAC")
+
+    def test_raw_to_voltage_uses_channel_table(self):
+        self.receiver.set_calibration(calibration.calibrate(self.receiver, self.sources))
+        self.assertEqual(list(self.receiver.raw_to_voltage(bytes([10, 100]), 2)),
+                         [self.receiver.voltage_tables[2][10], self.receiver.voltage_tables[2][100]], "Wrong table used")
+        self.receiver.set_calibration(None)
+        self.assertIs(self.receiver.voltage_tables[2], self.receiver.voltage_table, "Nominal table should be restored")
+
+    def test_unwired_channel(self):
+        result = calibration.calibrate(self.receiver, [self.sources[0], None], range(0, 256, 15))
+        self.assertEqual(result.tables[1:], [None, None, None], "Unwired channels should not be calibrated")
+        self.receiver.set_calibration(result)
+        self.assertIs(self.receiver.voltage_tables[1], self.receiver.voltage_table, "Unwired channel should use nominal table")
+
+    def test_store_and_apply(self):
+        path = os.path.join(self.directory, 'calibration.json')
+        result = calibration.calibrate(self.receiver, self.sources, range(0, 256, 15))
+        calibration.save(path, {(result.bus, result.address): result})
+        loaded = calibration.load(path)
+        self.assertEqual(loaded[(result.bus, result.address)].tables, result.tables, "Tables should survive storage")
+        other = Pcf8591(0, 0, 0, 3.3, VAGND, bus=self.bus)
+        self.assertEqual(calibration.apply([Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus), other], loaded), 1,
+                         "Calibration taken with other reference voltage should be skipped")
+
+    def test_reference_change_drops_calibration(self):
+        self.receiver.set_calibration(calibration.calibrate(self.receiver, self.sources, range(0, 256, 15)))
+        self.receiver.ref_voltage = 3.3
+        self.assertIsNone(self.receiver.calibration, "Calibration should be dropped with new reference voltage")
+
+
+if __name__ == '__main__':
+    unittest.main()
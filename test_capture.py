@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from capture import CaptureWriter, CaptureReader, RECORDS_PER_BLOCK
+
+ADDRESS = 0x48
+
+VREF = 5.1
+VAGND = 0.0
+
+
+class TestCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, records, append=False):
+        with CaptureWriter(self.path, ADDRESS, VREF, VAGND, rate=100.0, append=append) as writer:
+            for timestamp in range(records):
+                writer.append([timestamp % 256, 0, 51, 255], timestamp=timestamp)
+
+    def test_header(self):
+        self.write(1)
+        with CaptureReader(self.path) as reader:
+            self.assertEqual(reader.header['address'], ADDRESS, "Address should be stored in header")
+            self.assertEqual(reader.header['channel_layout'], (0, 1, 2, 3), "Channel layout should be stored in header")
+            self.assertEqual(reader.header['rate'], 100.0, "Rate should be stored in header")
+
+    def test_records(self):
+        self.write(RECORDS_PER_BLOCK + 10)  # more than one block
+        reader = CaptureReader(self.path)
+        self.assertEqual(len(reader), RECORDS_PER_BLOCK + 10, "All records should be readable")
+        self.assertEqual(reader.record(300), (300, bytes([300 % 256, 0, 51, 255])), "Wrong record read back")
+        self.assertEqual(reader.raw_column(2).tolist(), [51] * len(reader), "Wrong column read back")
+
+    def test_voltages(self):
+        self.write(3)
+        reader = CaptureReader(self.path)
+        voltages = reader.voltages(1, 2)
+        self.assertEqual(len(voltages), 1, "One record should be converted")
+        self.assertAlmostEqual(voltages[0][2], 1.02, msg="Raw 51 should convert to 1.02V")
+
+    def test_append(self):
+        self.write(5)
+        with open(self.path, 'ab') as capture_file:
+            capture_file.write(b'\x01\x02\x03')  # interrupted record
+        self.write(5, append=True)
+        reader = CaptureReader(self.path)
+        self.assertEqual(len(reader), 10, "Appended records should follow existing ones")
+        self.assertEqual(reader.record(5)[0], 0, "Partial record should be dropped before appending")
+
+    def test_append_header_mismatch(self):
+        self.write(2)
+        for changed in ({'vref': 3.3}, {'vagnd': 0.1}, {'rate': 50.0}, {'address': ADDRESS + 1}, {'channel_layout': (0, 1)}):
+            options = dict({'address': ADDRESS, 'vref': VREF, 'vagnd': VAGND, 'rate': 100.0, 'channel_layout': (0, 1, 2, 3)}, **changed)
+            with self.subTest(changed=changed):
+                with self.assertRaises(ValueError):
+                    CaptureWriter(self.path, append=True, **options)
+        with CaptureReader(self.path) as reader:
+            self.assertEqual(len(reader), 2, "Refused append should leave capture untouched")
+
+
+if __name__ == '__main__':
+    unittest.main()
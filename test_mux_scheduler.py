@@ -0,0 +1,65 @@
+import unittest
+
+from mux_scheduler import MuxScanScheduler
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+from tca9548a import TCA9548A
+
+MUX_ADDRESS = 0x70
+
+VREF = 5.1
+VAGND = 0.0
+
+
+class TestMuxScanScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedSMBus()
+        self.mux = self.bus.attach(MUX_ADDRESS, SimTCA9548A())
+        self.scheduler = MuxScanScheduler(TCA9548A(MUX_ADDRESS, bus=self.bus, shadow=True))
+
+    def add(self, channel, device, voltage=1.0):
+        """Attach simulated chip behind channel and declare its driver, return driver."""
+        self.mux.attach(channel, DEVICE_ADDRESS << 3 | device, SimPcf8591([voltage] * 4, VREF, VAGND))
+        driver = Pcf8591(device & 1, device >> 1 & 1, device >> 2 & 1, VREF, VAGND, bus=self.bus)
+        self.scheduler.add(driver, channel)
+        return driver
+
+    def test_add_bad_channel(self):
+        self.assertEqual(self.scheduler.add(Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus), 8), False,
+                         "Channel 8 does not exist, return value should be False")
+
+    def test_groups_colliding_channels(self):
+        for channel in range(8):
+            for device in range(5):
+                self.add(channel, device)
+        self.bus.transactions = 0
+        results = self.scheduler.scan()
+        self.assertEqual(list(results.values()), [[50, 50, 50, 50]] * 40, "Every device should be read")
+        self.assertEqual(self.bus.transactions, 8 + 40, "Mux should be switched once per channel")
+
+    def test_groups_disjoint_channels(self):
+        low = [self.add(1, device) for device in range(4)]
+        high = [self.add(6, device, 2.0) for device in range(4, 8)]
+        self.assertEqual(self.scheduler.plan(), [(0x42, low + high)], "Disjoint channels should share one group")
+        self.bus.transactions = 0
+        results = self.scheduler.scan()
+        self.assertEqual([results[driver][0] for driver in low + high], [50] * 4 + [100] * 4, "Every device should be read")
+        self.assertEqual(self.bus.transactions, 1 + 8, "Mux should be switched once for both channels")
+
+    def test_starts_with_enabled_group(self):
+        self.add(0, 0)
+        self.add(3, 0)
+        self.scheduler.scan()
+        self.bus.transactions = 0
+        self.scheduler.scan()
+        self.assertEqual(self.bus.transactions, 1 + 2, "Second scan should start with the group left enabled")
+
+    def test_failed_switch(self):
+        driver = self.add(2, 0)
+        self.bus.fault_rate = 1.0
+        self.assertEqual(self.scheduler.scan(), {driver: False}, "Devices behind a failed switch should be False")
+
+
+if __name__ == '__main__':
+    unittest.main()
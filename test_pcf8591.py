@@ -41,6 +41,16 @@ class TestPcf8591Driver(unittest.TestCase):
         driverGood = Pcf8591(self.A0, self.A1, self.A2, 2, 2.5)
         self.assertIsNone(driverGood.i2c_bus, "Vref - Vagnd is less than 0, so i2c bus must be None")
 
+    def test_class_init_shared_bus(self):
+        driver = Pcf8591(self.A0, self.A1, self.A2, VREF, VAGND)
+        self.assertIs(driver.i2c_bus, self.driverGood.i2c_bus, "Drivers on the same bus must share one bus handle")
+        driver.close()
+
+    def test_class_init_injected_bus(self):
+        bus = object()
+        driver = Pcf8591(self.A0, self.A1, self.A2, VREF, VAGND, bus=bus)
+        self.assertIs(driver.i2c_bus, bus, "Injected bus must be used as is")
+
     """ --------------------------- Control byte settings tests ----------------------- """
     def test_control_byte_dac(self):
         self.assertEqual(self.driverGood.set_control_byte(0, False, 0, True), 0x40, "Wrong value set in set_control_byte")
@@ -75,6 +85,20 @@ class TestPcf8591Driver(unittest.TestCase):
     def test_control_byte_voltage_read_all(self):
         self.assertEqual(self.driverGood.set_control_byte(0, True, 0, True), 0x44, "Wrong value set in set_control_byte")
 
+    """ --------------------------- Conversion tests ----------------------- """
+    def test_voltage_table_bounds(self):
+        self.assertEqual(self.driverGood.voltage_table[0], VAGND, "Raw value 0 should convert to 0V")
+        self.assertAlmostEqual(self.driverGood.voltage_table[255], VREF - VAGND, msg="Raw value 255 should convert to reference voltage")
+
+    def test_voltage_table_rebuilt(self):
+        driver = Pcf8591(self.A0, self.A1, self.A2, VREF, VAGND)
+        driver.ref_voltage = 2.55
+        self.assertAlmostEqual(driver.voltage_table[100], 1.0, msg="Table should be rebuilt when reference voltage changes")
+
+    def test_raw_to_voltage(self):
+        volts = self.driverGood.raw_to_voltage(bytes([0, 51, 255]))
+        self.assertEqual([round(v, 6) for v in volts], [round(self.driverGood.voltage_table[raw], 6) for raw in (0, 51, 255)], "Batch conversion should match lookup table")
+
     """ --------------------------- Dac tests with good address ----------------------- """
     def test_dac_lower_bound(self):
         self.assertEqual(self.driverGood.analog_write(0), True, "Digital input is 0, return value should be True")
@@ -92,6 +116,12 @@ class TestPcf8591Driver(unittest.TestCase):
         rand = randrange(255)
         self.assertEqual(self.driverGood.analog_write(rand), True, "Digital input is {}, return value should be True".format(rand))
 
+    def test_dac_sequence(self):
+        self.assertEqual(self.driverGood.analog_write_sequence(range(256), repeat=2), True, "Sequence is in range, return value should be True")
+
+    def test_dac_sequence_outside_bound(self):
+        self.assertEqual(self.driverGood.analog_write_sequence([0, 128, 256]), False, "Sequence contains 256, return value should be False")
+
     """ --------------------------- Dac tests with bad address ----------------------- """
     def test_wrong_address_dac_lower_bound(self):
         self.assertEqual(self.driverBad.analog_write(0), False, "Address is wrong, return value should be False")
@@ -125,6 +155,12 @@ class TestPcf8591Driver(unittest.TestCase):
     def test_analog_read_all_raw(self):
         self.assertEqual(type(self.driverGood.analog_read_all_raw()), list, "Address is correct, return value should be list")
 
+    def test_analog_read_all_raw_length(self):
+        self.assertEqual(len(self.driverGood.analog_read_all_raw()), 4, "Address is correct, all 4 channels should be returned")
+
+    def test_stream_length(self):
+        self.assertEqual(len(self.driverGood.stream(0, 64)), 64, "Address is correct, 64 samples should be returned")
+
     def test_voltage_read_AIN0(self):
         self.assertEqual(type(self.driverGood.voltage_read_AIN0()), float, "Address is correct, return value should be float")
 
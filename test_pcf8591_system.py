@@ -1,5 +1,6 @@
 import unittest
 
+import calibration
 from pcf8591 import Pcf8591
 
 ADRESS_GOOD = 0x09 #address of device on A0=0, A1=0, A2=0
@@ -47,19 +48,33 @@ class TestPcf8591System(unittest.TestCase):
 
         steps = 255
         for value in range(steps):
-            
-            voltage_in = []
+
             #generate voltage values for inputs
-            voltage_in.append(self.driverAIN0.DAC(value))
-            voltage_in.append(self.driverAIN1.DAC(value))
-            voltage_in.append(self.driverAIN2.DAC(value))
-            voltage_in.append(self.driverAIN3.DAC(value))
+            self.driverAIN0.analog_write(value)
+            self.driverAIN1.analog_write(value)
+            self.driverAIN2.analog_write(value)
+            self.driverAIN3.analog_write(value)
 
             analogs_raw = self.driverReceiver.analog_read_all_raw()
 
             for i, raw_value in enumerate(analogs_raw):
-                with self.subTest(raw_value=raw_value):
-                    self.assesrtAlmostEqual(raw_value, voltage_in[i], delta=1)
+                with self.subTest(value=value, pin=i):
+                    self.assertAlmostEqual(raw_value, value, delta=1)
+
+    def test_system_calibration(self):
+        sources = [self.driverAIN0, self.driverAIN1, self.driverAIN2, self.driverAIN3]
+        result = calibration.calibrate(self.driverReceiver, sources)
+        self.assertNotEqual(result, False, "Calibration sweep failed")
+        self.driverReceiver.set_calibration(result)
+        try:
+            for value in (25, 128, 230):
+                for source in sources:
+                    source.analog_write(value)
+                for i, voltage in enumerate(self.driverReceiver.voltage_read_all()):
+                    with self.subTest(value=value, pin=i):
+                        self.assertAlmostEqual(voltage, sources[i].voltage_table[value], delta=VREF / 255)
+        finally:
+            self.driverReceiver.set_calibration(None)
 
 if __name__ == '__main__':
     unittest.main()
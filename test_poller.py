@@ -0,0 +1,72 @@
+import time
+import unittest
+
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from poller import Poller
+from resilience import DeviceError
+from sim_bus import SimulatedSMBus, SimPcf8591
+
+VREF = 5.1
+VAGND = 0.0
+
+
+def wait_for(condition, timeout=2.0):
+    """Wait until condition() is true, return its last value."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+class TestPoller(unittest.TestCase):
+
+    def setUp(self):
+        self.buses = [SimulatedSMBus(), SimulatedSMBus()]
+        for index, bus in enumerate(self.buses):
+            bus.attach(DEVICE_ADDRESS << 3, SimPcf8591([1.0 + index] * 4, VREF, VAGND))
+        self.drivers = [Pcf8591(0, 0, 0, VREF, VAGND, bus=bus) for bus in self.buses]
+        self.poller = Poller(interval=0.001)
+
+    def tearDown(self):
+        self.poller.stop(timeout=1.0)
+
+    def test_worker_per_bus(self):
+        for driver in self.drivers:
+            self.assertTrue(self.poller.add(driver), "Device with bus should be accepted")
+        self.poller.add(Pcf8591(1, 0, 0, VREF, VAGND, bus=self.buses[0]))
+        self.poller.start()
+        self.assertEqual(len(self.poller.workers), 2, "One worker per bus should be started")
+        self.assertTrue(wait_for(lambda: all(self.poller.read(driver) for driver in self.drivers)), "Both buses should be polled")
+        self.assertEqual([self.poller.read(driver)[1] for driver in self.drivers], [[50] * 4, [100] * 4], "Wrong latest scans")
+
+    def test_add_without_bus(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.buses[0])
+        driver.i2c_bus = None
+        self.assertFalse(self.poller.add(driver), "Device without bus should be refused")
+        self.assertEqual(self.poller.bus_groups, {}, "Refused device should not be grouped")
+
+    def test_full_subscriber_drops_scans(self):
+        subscriber = self.poller.subscribe(maxsize=2)
+        self.poller.add(self.drivers[0])
+        self.poller.start()
+        wait_for(lambda: self.buses[0].transactions > 10)
+        self.assertEqual(subscriber.qsize(), 2, "Scans should be dropped when the queue is full")
+        self.assertEqual(subscriber.get_nowait()[0], self.drivers[0], "Queued scan should name its device")
+
+    def test_errors(self):
+        missing = Pcf8591(1, 0, 0, VREF, VAGND, bus=self.buses[0])  # nothing answers on this address
+        broken = Pcf8591(0, 1, 0, VREF, VAGND, bus=self.buses[0])
+        broken.analog_read_all_raw = lambda: 1 / 0
+        for driver in (missing, broken, self.drivers[0]):
+            self.poller.add(driver)
+        self.poller.start()
+        self.assertTrue(wait_for(lambda: len(self.poller.errors) == 2), "Both failing devices should be recorded")
+        self.assertIsInstance(self.poller.errors[missing][1], DeviceError, "Failed read should be kept as DeviceError")
+        self.assertIsInstance(self.poller.errors[broken][1], ZeroDivisionError, "Raised exception should be kept")
+        transactions = self.buses[0].transactions
+        self.assertTrue(wait_for(lambda: self.buses[0].transactions > transactions + 4), "Worker should keep polling")
+        self.assertEqual(self.poller.read(self.drivers[0])[1], [50] * 4, "Healthy device should still be polled")
+
+
+if __name__ == '__main__':
+    unittest.main()
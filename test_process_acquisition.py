@@ -0,0 +1,110 @@
+import time
+import unittest
+
+from pcf8591 import DEVICE_ADDRESS
+from process_acquisition import DeviceSpec, MultiBusAcquisition, SharedRing, RECORD_HEADER
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+
+MUX_ADDRESS = 0x70
+
+VREF = 5.1
+VAGND = 0.0
+
+
+def simulated_bus(bus_number):
+    """Bus with device 0 directly on it and device 1 behind mux channel 2, inputs depend on bus number."""
+    bus = SimulatedSMBus()
+    bus.attach(DEVICE_ADDRESS << 3, SimPcf8591([bus_number] * 4, VREF, VAGND))
+    mux = bus.attach(MUX_ADDRESS, SimTCA9548A())
+    mux.attach(2, DEVICE_ADDRESS << 3 | 1, SimPcf8591([2.0] * 4, VREF, VAGND))
+    return bus
+
+
+def failing_bus(bus_number):
+    """Bus factory of a worker that can not open its bus."""
+    raise IOError("Bus {} is not available".format(bus_number))
+
+
+class TestSharedRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = SharedRing(2, capacity=4)
+
+    def tearDown(self):
+        self.ring.close()
+        self.ring.unlink()
+
+    def test_read_wraps(self):
+        for value in range(6):
+            self.ring.write(bytes([value, value]))
+        views, position, lost = self.ring.read(2)
+        self.assertEqual(b''.join(bytes(view) for view in views), bytes([2, 2, 3, 3, 4, 4, 5, 5]), "Wrong records read back")
+        self.assertEqual((position, lost), (6, 0), "All records should be read without loss")
+        del views
+
+    def test_overwritten_while_in_use(self):
+        for value in range(4):
+            self.ring.write(bytes([value, value]))
+        views, position, lost = self.ring.read(0)
+        self.assertEqual(self.ring.overwritten(0, position), 0, "Nothing should be overwritten yet")
+        self.ring.write(bytes([4, 4]))
+        self.ring.write(bytes([5, 5]))
+        self.assertEqual(bytes(views[0][:2]), bytes([4, 4]), "First view record should be replaced")
+        self.assertEqual(self.ring.overwritten(0, position), 2, "Overwritten records should be reported")
+        del views
+
+    def test_read_lost(self):
+        for value in range(6):
+            self.ring.write(bytes([value, value]))
+        views, position, lost = self.ring.read(0)
+        self.assertEqual(lost, 2, "Two oldest records should be reported lost")
+        del views
+
+
+class TestMultiBusAcquisition(unittest.TestCase):
+
+    def test_buses_in_parallel(self):
+        specs = [DeviceSpec(0, VREF, VAGND), DeviceSpec(1, VREF, VAGND, MUX_ADDRESS, 2)]
+        acquisition = MultiBusAcquisition({1: specs, 3: specs}, interval=0.001, bus_factory=simulated_bus)
+        acquisition.start()
+        time.sleep(0.5)
+        try:
+            for bus_number in (1, 3):
+                views, lost = acquisition.read(bus_number)
+                self.assertTrue(views, "Bus {} should have produced records".format(bus_number))
+                record = bytes(views[0][:RECORD_HEADER.size + 8])
+                self.assertEqual(RECORD_HEADER.unpack_from(record)[1], 0b11, "Both devices should be read")
+                self.assertEqual(record[RECORD_HEADER.size:], bytes([bus_number * 50] * 4 + [100] * 4), "Wrong raw values")
+                del views
+        finally:
+            acquisition.stop()
+
+    def test_overwritten_reported(self):
+        acquisition = MultiBusAcquisition({1: [DeviceSpec(0, VREF, VAGND)]}, capacity=4, bus_factory=simulated_bus)
+        acquisition.start()
+        try:
+            deadline = time.monotonic() + 5.0
+            while acquisition.rings[1].write_count < 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            views, lost = acquisition.read(1)
+            while acquisition.rings[1].write_count < acquisition.read_positions[1] + 4 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(acquisition.overwritten(1), sum(len(view) for view in views) // acquisition.rings[1].record_size,
+                             "Every record of the lapped read should be reported overwritten")
+            del views
+        finally:
+            acquisition.stop()
+
+    def test_dead_worker(self):
+        acquisition = MultiBusAcquisition({2: [DeviceSpec(0, VREF, VAGND)]}, bus_factory=failing_bus)
+        acquisition.start()
+        try:
+            acquisition.processes[2].join(5.0)
+            with self.assertRaises(RuntimeError):
+                acquisition.read(2)
+        finally:
+            acquisition.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import errno
+import unittest
+
+from mux_scheduler import MuxScanScheduler
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from resilience import CircuitBreaker, DeviceError, RetryPolicy, NO_BUS
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+from tca9548a import TCA9548A
+
+VREF = 5.1
+VAGND = 0.0
+
+ADDRESS = DEVICE_ADDRESS << 3  # A0=0, A1=0, A2=0
+MUX_ADDRESS = 0x70
+
+
+class FlakyBus(SimulatedSMBus):
+    """Simulated bus failing the transactions whose numbers (counted from 1) are listed in failing."""
+
+    def __init__(self, failing=()):
+        super(FlakyBus, self).__init__()
+        self.failing = set(failing)
+
+    def transaction(self, length):
+        super(FlakyBus, self).transaction(length)
+        if self.transactions in self.failing:
+            raise IOError(errno.EIO, "Injected bus fault")
+
+
+class TestResilience(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = FlakyBus()
+        self.bus.attach(ADDRESS, SimPcf8591([0.0, 1.0, 2.55, VREF], VREF, VAGND))
+
+    """ --------------------------- Retry tests ----------------------- """
+    def test_retry_recovers(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, retry=RetryPolicy(3, backoff=0.0))
+        self.bus.failing = {1, 2}
+        self.assertEqual(driver.analog_read_all_raw(), [0, 50, 128, 255], "Third attempt should succeed")
+        self.assertIsNone(driver.last_error, "Successful read should clear last error")
+
+    def test_retry_exhausted(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, retry=RetryPolicy(2, backoff=0.0))
+        self.bus.failing = {1, 2}
+        self.assertEqual(driver.analog_read_raw(1), False, "Read should fail after two attempts")
+        self.assertIsInstance(driver.last_error, DeviceError, "Failure should be kept as DeviceError")
+        self.assertEqual((driver.last_error.address, driver.last_error.operation, driver.last_error.attempts),
+                         (ADDRESS, 'analog_read_raw', 2), "Wrong error details")
+
+    def test_retry_reselects_channel(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, pipelined=True, retry=RetryPolicy(2, backoff=0.0))
+        driver.analog_read_raw(2)
+        self.bus.failing = {self.bus.transactions + 1}
+        self.assertEqual(driver.analog_read_raw(2), 128, "Retry should read the same channel again")
+
+    def test_sample_into_resumes_failed_block(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, retry=RetryPolicy(2, backoff=0.0))
+        self.bus.failing = {2}
+        samples = bytearray(12)
+        self.assertEqual(driver.sample_into(samples, 1, burst_size=4), 12, "All samples should be read")
+        self.assertEqual(samples, bytearray([50] * 12), "Wrong samples")
+        self.assertEqual(self.bus.transactions, 4, "Only the failed block should be read again")
+
+    """ --------------------------- Partial scan tests ----------------------- """
+    def test_partial_scan(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus)
+        self.bus.failing = {1, 3}  # scan and then the single read of AIN1
+        self.assertEqual(driver.analog_read_all_raw(partial=True), [0, None, 128, 255], "AIN1 should be marked invalid")
+        self.bus.failing = {6, 7, 8, 9, 10}
+        self.assertEqual(driver.voltage_read_all(partial=True), False, "No channel read, return value should be False")
+
+    def test_partial_scan_is_one_operation(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=60.0)
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, breaker=breaker)
+        self.bus.failing = {1, 2, 3, 4, 5}  # scan and all four single reads
+        self.assertEqual(driver.analog_read_all_raw(partial=True), False, "No channel read, return value should be False")
+        self.assertEqual((breaker.failures, breaker.opened_at), (1, None), "Failed scan should count as one failure")
+        self.assertEqual(driver.last_error.operation, 'analog_read_all_raw', "Failure should name the scan")
+
+    def test_partial_scan_no_ack(self):
+        driver = Pcf8591(1, 0, 0, VREF, VAGND, bus=self.bus, retry=RetryPolicy(2, backoff=0.0))  # nothing answers
+        self.assertEqual(driver.analog_read_all_raw(partial=True), False, "Missing device should not be read")
+        self.assertEqual(self.bus.transactions, 2, "Missing device should get no per-channel fallback")
+
+    def test_no_bus(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus)
+        driver.i2c_bus = None
+        self.assertEqual(driver.analog_read_raw(0), False, "Driver without bus should fail the read")
+        self.assertEqual(driver.analog_read_all_raw(partial=True), False, "Driver without bus should fail the scan")
+        self.assertEqual(driver.last_error.reason, NO_BUS, "Error should tell that there is no bus")
+        self.assertFalse(driver.last_error.circuit_open, "Missing bus is not an open breaker")
+
+    """ --------------------------- Circuit breaker tests ----------------------- """
+    def test_breaker_skips_failing_device(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=60.0)
+        driver = Pcf8591(1, 0, 0, VREF, VAGND, bus=self.bus, breaker=breaker)  # nothing answers on this address
+        driver.analog_read_raw(0)
+        driver.analog_read_raw(0)
+        transactions = self.bus.transactions
+        self.assertEqual(driver.analog_read_raw(0), False, "Open breaker should fail the read")
+        self.assertEqual(self.bus.transactions, transactions, "Open breaker should not touch the bus")
+        self.assertTrue(driver.last_error.circuit_open, "Error should tell that the breaker is open")
+        self.assertEqual(breaker.trips, 1, "Breaker should have opened once")
+
+    def test_breaker_trial_closes(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0.0)
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, breaker=breaker)
+        self.bus.failing = {1}
+        driver.analog_read_raw(0)
+        self.assertIsNotNone(breaker.opened_at, "Failure should open the breaker")
+        self.assertEqual(driver.analog_read_raw(1), 50, "Trial read after cooldown should go through")
+        self.assertIsNone(breaker.opened_at, "Successful trial should close the breaker")
+
+    def test_scheduler_skips_open_breaker(self):
+        mux = self.bus.attach(MUX_ADDRESS, SimTCA9548A())
+        del self.bus.devices[ADDRESS]
+        mux.attach(0, ADDRESS, SimPcf8591([1.0] * 4, VREF, VAGND))
+        scheduler = MuxScanScheduler(TCA9548A(MUX_ADDRESS, bus=self.bus, shadow=True))
+        healthy = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus)
+        broken = Pcf8591(0, 1, 0, VREF, VAGND, bus=self.bus, breaker=CircuitBreaker(threshold=1, cooldown=60.0))
+        scheduler.add(healthy, 0)
+        scheduler.add(broken, 1)
+        scheduler.scan()
+        transactions = self.bus.transactions
+        results = scheduler.scan()
+        self.assertEqual(results, {healthy: [50] * 4, broken: False}, "Healthy device should still be read")
+        self.assertEqual(self.bus.transactions - transactions, 1, "Only the healthy device should be read")
+
+    """ --------------------------- TCA9548A tests ----------------------- """
+    def test_mux_not_found(self):
+        mux = TCA9548A(MUX_ADDRESS + 1, bus=SimulatedSMBus())
+        self.assertIsNone(mux.i2c_bus, "Missing mux should have no bus")
+        self.assertEqual(mux.set_channel(1, 1), False, "Channel of missing mux can not be set")
+        self.assertIsNone(mux.get_channel(1), "Channel of missing mux can not be read")
+        scheduler = MuxScanScheduler(mux)
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus)
+        scheduler.add(driver, 1)
+        self.assertEqual(scheduler.scan(), {driver: False}, "Devices behind missing mux should be False")
+
+    def test_mux_write_error(self):
+        self.bus.attach(MUX_ADDRESS, SimTCA9548A())
+        mux = TCA9548A(MUX_ADDRESS, bus=self.bus, shadow=True, retry=RetryPolicy(2, backoff=0.0))
+        self.bus.failing = {self.bus.transactions + 1, self.bus.transactions + 2}
+        self.assertEqual(mux.set_control_register(0x01), False, "Write should fail after two attempts")
+        self.assertEqual(mux.last_error.operation, 'set_control_register', "Failure should be kept as DeviceError")
+        self.assertIsNone(mux.shadow_register, "Shadow register should be dropped after failed write")
+
+
+if __name__ == '__main__':
+    unittest.main()
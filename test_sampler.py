@@ -0,0 +1,46 @@
+import unittest
+
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from sampler import FixedRateSampler
+from sim_bus import SimulatedSMBus, SimPcf8591
+
+VREF = 5.1
+VAGND = 0.0
+
+ADDRESS = DEVICE_ADDRESS << 3  # A0=0, A1=0, A2=0
+
+
+class TestFixedRateSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedSMBus()
+        self.bus.attach(ADDRESS, SimPcf8591([0.0, 1.0, 2.55, VREF], VREF, VAGND))
+        self.driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus)
+
+    def test_evenly_spaced_deadlines(self):
+        sampler = FixedRateSampler(self.driver, 1000, mode='all')
+        results = sampler.run(20)
+        self.assertEqual(len(results), 20, "Every period should deliver a sample")
+        self.assertEqual([results[i + 1][0] - results[i][0] for i in range(19)], [1000000] * 19, "Deadlines should be 1ms apart")
+        self.assertEqual(results[0][2], [0, 50, 128, 255], "Wrong scan delivered")
+
+    def test_batch_when_behind(self):
+        self.bus.latency = 0.005  # every read takes longer than the 1ms period
+        sampler = FixedRateSampler(self.driver, 1000, mode='single', pin=1)
+        results = sampler.run(30)
+        self.assertEqual([data for _, _, data in results], [50] * 30, "Missed periods should be filled by batched reads")
+        self.assertGreater(sampler.overruns, 0, "Overruns should be counted")
+        self.assertLess(sampler.reads, 30, "Missed periods should be read in batches")
+        self.assertEqual(sum(sampler.jitter_histogram), sampler.reads, "Every read should be in jitter histogram")
+        read_times = [read_ns for _, read_ns, _ in results]
+        self.assertEqual(sorted(set(read_times)), read_times, "Batched samples should get their own conversion times")
+
+    def test_burst_mode(self):
+        sampler = FixedRateSampler(self.driver, 100, mode='burst', pin=2, burst_size=16)
+        results = sampler.run(3)
+        self.assertEqual([bytes(data) for _, _, data in results], [bytes([128] * 16)] * 3, "Each period should deliver one block")
+        self.assertGreater(sampler.achieved_rate, 0, "Achieved rate should be measured")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import itertools
+import threading
+import time
+import unittest
+
+from pcf8591 import Pcf8591, DEVICE_ADDRESS, DIFFERENTIAL_TO_AIN3, MIXED, TWO_DIFFERENTIAL
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+
+VREF = 5.1
+VAGND = 0.0
+
+ADDRESS = DEVICE_ADDRESS << 3  # A0=0, A1=0, A2=0
+MUX_ADDRESS = 0x70
+
+
+class TestSimulatedBus(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedSMBus()
+        self.chip = self.bus.attach(ADDRESS, SimPcf8591([0.0, 1.0, 2.55, VREF], VREF, VAGND))
+        self.driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus)
+
+    """ --------------------------- Pcf8591 model tests ----------------------- """
+    def test_first_read_after_power_on(self):
+        self.assertEqual(self.bus.read_byte(ADDRESS), 0x80, "First byte after power on should be 80h")
+
+    def test_analog_read_raw(self):
+        self.assertEqual(self.driver.analog_read_raw(2), 128, "2.55V on 5.1V reference should read 128")
+
+    def test_analog_read_all_raw(self):
+        self.assertEqual(self.driver.analog_read_all_raw(), [0, 50, 128, 255], "Wrong readouts of all channels")
+
+    def test_analog_read_all_raw_single_transaction(self):
+        self.driver.analog_read_all_raw()
+        self.assertEqual(self.bus.transactions, 1, "Reading all channels should take one transaction")
+
+    def test_voltage_read_all(self):
+        reads = self.driver.voltage_read_all()
+        self.assertAlmostEqual(reads[1], 1.0, msg="AIN1 should read 1V")
+        self.assertAlmostEqual(reads[3], VREF, msg="AIN3 should read reference voltage")
+
+    def test_stream(self):
+        samples = self.driver.stream(1, 100, burst_size=32)
+        self.assertEqual(samples, bytearray([50]) * 100, "Every streamed sample should come from AIN1")
+        self.assertEqual(self.bus.transactions, 4, "100 samples in bursts of 32 should take 4 transactions")
+
+    def test_stream_bad_burst_size(self):
+        for burst_size in (0, -1):
+            with self.subTest(burst_size=burst_size):
+                self.assertEqual(self.driver.stream(1, 8, burst_size=burst_size), False, "Burst size below 1 should be rejected")
+        self.assertEqual(self.bus.transactions, 0, "Rejected stream should not touch the bus")
+
+    def test_analog_write(self):
+        self.driver.analog_write(51)
+        self.assertAlmostEqual(self.chip.dac_voltage, 1.02, msg="DAC value 51 should output 1.02V")
+
+    def test_analog_write_sequence(self):
+        self.driver.analog_write_sequence([10, 20, 30], repeat=2)
+        self.assertEqual(self.chip.dac_value, 30, "DAC should hold last value of sequence")
+        self.assertEqual(self.bus.transactions, 2, "Each repetition should take one transaction")
+
+    def test_analog_write_sequence_paced(self):
+        values = []
+        chip_write = self.chip.write
+
+        def write(data):
+            values.append((time.monotonic(), data[-1]))  # time and DAC value of every write
+            chip_write(data)
+
+        self.chip.write = write
+        started = time.monotonic()
+        self.assertTrue(self.driver.analog_write_sequence(list(range(20)), repeat=2, rate=500), "Sequence should be played")
+        elapsed = time.monotonic() - started
+        self.assertEqual([value for _, value in values], list(range(20)) * 2, "Slow rate should write one value at a time")
+        self.assertGreaterEqual(elapsed, 40 / 500.0, "Call should return after the period of the last value")
+        self.assertGreaterEqual(values[-1][0] - started, 39 / 500.0, "Values should be spread over the periods")
+
+    def test_analog_write_sequence_fast_rate(self):
+        self.driver.analog_write_sequence(list(range(36)), rate=10000)
+        self.assertEqual(self.bus.transactions, 2, "Rate close to bus speed should send 18 values per write")
+        self.bus.transactions = 0
+        self.assertEqual(self.driver.analog_write_sequence([1, 2], burst_size=0), False, "Burst size below 1 should be rejected")
+        self.assertEqual(self.bus.transactions, 0, "Rejected sequence should not touch the bus")
+
+    def test_voltage_read_oversampled(self):
+        self.chip.inputs[0] = itertools.cycle([0.0, 0.02]).__next__  # alternates between codes 0 and 1
+        self.assertAlmostEqual(self.driver.voltage_read(0, oversample=64), 0.01, msg="Mean of 0V and 0.02V should be 0.01V")
+
+    def test_analog_read_all_oversampled_extra_bits(self):
+        reads = self.driver.analog_read_all_oversampled(16, extra_bits=2)
+        self.assertEqual(reads, [0, 200, 512, 1020], "Readouts should be scaled to 10 bits")
+        self.assertEqual(self.bus.transactions, 1, "All oversampled scans should take one transaction")
+
+    def test_analog_read_mode_all_raw_differential(self):
+        self.assertEqual(self.driver.analog_read_mode_all_raw(TWO_DIFFERENTIAL), [-50, -128], "AIN0-AIN1 should be negative, AIN2-AIN3 should clip at -128")
+        self.assertEqual(self.bus.transactions, 1, "Differential scan should take one transaction")
+
+    def test_analog_read_mode_all_raw_mixed(self):
+        self.assertEqual(self.driver.analog_read_mode_all_raw(MIXED), [0, 50, -128], "Wrong readouts in mixed mode")
+
+    def test_voltage_read_mode(self):
+        self.chip.inputs = [1.0, 1.5, 2.0, 2.0]
+        self.assertAlmostEqual(self.driver.voltage_read_mode(DIFFERENTIAL_TO_AIN3, 1), -0.5, msg="AIN1-AIN3 should be -0.5V")
+
+    def test_repeated_read_skips_control_byte(self):
+        self.driver.analog_read_raw(1)
+        self.driver.analog_read_raw(1)
+        self.assertEqual(self.bus.transactions, 2, "Each read should take one transaction")
+        self.assertEqual(self.bus.bytes_transferred, 5 + 3, "Second read should not write control byte")
+
+    def test_pipelined_read(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, pipelined=True)
+        values = [driver.analog_read_raw(2) for _ in range(3)]
+        self.assertEqual(values, [128, 128, 128], "Pipelined reads should return conversions of the same channel")
+        self.assertEqual(self.bus.bytes_transferred, 5 + 2 + 2, "Repeated pipelined reads should be single byte reads")
+
+    def test_pipelined_read_after_channel_change(self):
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=self.bus, pipelined=True)
+        driver.analog_read_raw(2)
+        driver.analog_read_all_raw()
+        self.assertEqual(driver.analog_read_raw(2), 128, "Control byte should be rewritten after auto increment scan")
+
+    def test_dac_write_during_sticky_read(self):
+        self.driver.analog_read_raw(1)
+        writer = threading.Thread(target=self.driver.analog_write, args=(200,))
+        transaction = self.bus.transaction
+
+        def interleave(length):
+            # DAC write from another thread while the sticky read is about to go on the bus
+            if writer.ident is None:
+                writer.start()
+                writer.join(0.1)
+            transaction(length)
+
+        self.bus.transaction = interleave
+        self.assertEqual(self.driver.analog_read_raw(1), 50, "DAC write should not change channel of a running read")
+        writer.join()
+        self.assertEqual(self.chip.dac_value, 200, "DAC write should follow the read")
+        self.assertEqual(self.driver.analog_read_raw(1), 50, "Read after DAC write should select AIN1 again")
+
+    """ --------------------------- Bus tests ----------------------- """
+    def test_missing_device(self):
+        driver = Pcf8591(1, 1, 1, VREF, VAGND, bus=self.bus)
+        self.assertEqual(driver.analog_read_all_raw(), False, "No device on address, return value should be False")
+
+    def test_fault_injection(self):
+        bus = SimulatedSMBus(fault_rate=1.0)
+        bus.attach(ADDRESS, SimPcf8591())
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=bus)
+        self.assertEqual(driver.analog_read_all_raw(), False, "Every transaction fails, return value should be False")
+
+    def test_mux_channel_gating(self):
+        bus = SimulatedSMBus()
+        mux = bus.attach(MUX_ADDRESS, SimTCA9548A())
+        mux.attach(3, ADDRESS, SimPcf8591([1.0, 1.0, 1.0, 1.0], VREF, VAGND))
+        driver = Pcf8591(0, 0, 0, VREF, VAGND, bus=bus)
+        self.assertEqual(driver.analog_read_all_raw(), False, "Channel is disabled, device should not answer")
+        bus.write_byte(MUX_ADDRESS, 1 << 3)
+        self.assertEqual(driver.analog_read_all_raw(), [50, 50, 50, 50], "Channel is enabled, device should answer")
+
+    def test_mux_address_collision(self):
+        bus = SimulatedSMBus()
+        mux = bus.attach(MUX_ADDRESS, SimTCA9548A())
+        mux.attach(0, ADDRESS, SimPcf8591())
+        mux.attach(1, ADDRESS, SimPcf8591())
+        bus.write_byte(MUX_ADDRESS, 0x03)
+        with self.assertRaises(IOError):
+            bus.read_byte(ADDRESS)
+
+
+if __name__ == '__main__':
+    unittest.main()
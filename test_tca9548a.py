@@ -0,0 +1,76 @@
+import unittest
+
+from sim_bus import SimulatedSMBus, SimTCA9548A
+from tca9548a import TCA9548A
+
+MUX_ADDRESS = 0x70
+
+
+class TestTCA9548ADriver(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = SimulatedSMBus()
+        self.mux = self.bus.attach(MUX_ADDRESS, SimTCA9548A())
+        self.driver = TCA9548A(MUX_ADDRESS, bus=self.bus)
+
+    """ --------------------------- Init tests ----------------------- """
+    def test_class_init_good_address(self):
+        self.assertIsNotNone(self.driver.i2c_bus, "Address is good, so i2c bus must be Not None")
+
+    def test_class_init_bad_address(self):
+        driver = TCA9548A(MUX_ADDRESS + 1, bus=self.bus)
+        self.assertIsNone(driver.i2c_bus, "No device on address, so i2c bus must be None")
+
+    """ --------------------------- Channel tests ----------------------- """
+    def test_set_channel(self):
+        self.assertEqual(self.driver.set_channel(3, 1), True, "Channel 3 is valid, return value should be True")
+        self.assertEqual(self.mux.register, 0x08, "Only channel 3 should be enabled")
+        self.assertEqual(self.driver.get_channel(3), 1, "Channel 3 should read as enabled")
+
+    def test_set_channel_bad_state(self):
+        self.assertEqual(self.driver.set_channel(3, 2), False, "State 2 is invalid, return value should be False")
+
+    """ --------------------------- Shadow register tests ----------------------- """
+    def test_shadow_skips_redundant_write(self):
+        driver = TCA9548A(MUX_ADDRESS, bus=self.bus, shadow=True)
+        self.bus.transactions = 0
+        driver.set_control_register(0x01)
+        driver.set_control_register(0x01)
+        driver.get_channel(0)
+        self.assertEqual(self.bus.transactions, 1, "Only the first write should reach the bus")
+
+    def test_shadow_serves_reads(self):
+        driver = TCA9548A(MUX_ADDRESS, bus=self.bus, shadow=True)
+        self.bus.transactions = 0
+        driver.set_channel(2, 1)
+        driver.set_channel(5, 1)
+        self.assertEqual((driver.get_channel(2), driver.get_channel(5)), (1, 1), "Both channels should read as enabled")
+        self.assertEqual(self.bus.transactions, 2, "Read-modify-write should not read the device")
+        self.assertEqual(self.mux.register, 0x24, "Device should hold both channels")
+
+    def test_shadow_dropped_after_failed_write(self):
+        driver = TCA9548A(MUX_ADDRESS, bus=self.bus, shadow=True)
+        self.bus.fault_rate = 1.0
+        self.assertEqual(driver.set_control_register(0x01), False, "Failed write should return False")
+        self.assertIsNone(driver.shadow_register, "Unknown device state should not be cached")
+        self.bus.fault_rate = 0.0
+        self.mux.register = 0x40
+        self.assertEqual(driver.get_control_register(), 0x40, "Register should be read from the device again")
+
+    def test_no_shadow_reads_device(self):
+        self.bus.transactions = 0
+        self.driver.set_control_register(0x01)
+        self.driver.set_control_register(0x01)
+        self.driver.get_channel(0)
+        self.assertEqual(self.bus.transactions, 3, "Without shadow every access should reach the bus")
+
+    def test_shadow_resync(self):
+        driver = TCA9548A(MUX_ADDRESS, bus=self.bus, shadow=True)
+        self.mux.register = 0x80  # changed behind the driver's back
+        self.assertEqual(driver.get_channel(7), 0, "Cached register should be used until resync")
+        self.assertEqual(driver.resync(), 0x80, "Resync should read the device")
+        self.assertEqual(driver.get_channel(7), 1, "Channel 7 should be enabled after resync")
+
+
+if __name__ == '__main__':
+    unittest.main()
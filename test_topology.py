@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from pcf8591 import DEVICE_ADDRESS
+from sim_bus import SimulatedSMBus, SimPcf8591, SimTCA9548A
+from topology import Location, Topology, discover, load_or_discover
+
+MUX_ADDRESS = 0x70
+
+VREF = 5.1
+VAGND = 0.0
+
+
+class TestTopology(unittest.TestCase):
+
+    def setUp(self):
+        # bus 1: device 0 directly, device 1 behind channel 2 and device 0 behind channel 5 (collides with direct one)
+        # bus 3: device 7 directly
+        self.buses = {1: SimulatedSMBus(), 3: SimulatedSMBus()}
+        self.buses[1].attach(DEVICE_ADDRESS << 3, SimPcf8591([1.0] * 4, VREF, VAGND))
+        self.mux = self.buses[1].attach(MUX_ADDRESS, SimTCA9548A())
+        self.mux.register = 0x10
+        self.mux.attach(2, DEVICE_ADDRESS << 3 | 1, SimPcf8591([2.0] * 4, VREF, VAGND))
+        self.mux.attach(5, DEVICE_ADDRESS << 3, SimPcf8591([3.0] * 4, VREF, VAGND))
+        self.buses[3].attach(DEVICE_ADDRESS << 3 | 7, SimPcf8591([4.0] * 4, VREF, VAGND))
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'topology.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def bus_factory(self, bus_number):
+        return self.buses[bus_number]
+
+    def test_discover(self):
+        topology = discover([1, 3], bus_factory=self.bus_factory)
+        self.assertEqual(topology.muxes, {1: [MUX_ADDRESS], 3: []}, "Wrong switches found")
+        self.assertEqual(topology.devices, [Location(1, DEVICE_ADDRESS << 3, None, None),
+                                            Location(1, DEVICE_ADDRESS << 3 | 1, MUX_ADDRESS, 2),
+                                            Location(3, DEVICE_ADDRESS << 3 | 7, None, None)], "Wrong devices found")
+        self.assertEqual(self.mux.register, 0x10, "Switch register should be restored")
+
+    def test_build_drivers(self):
+        drivers, schedulers = discover([1, 3], bus_factory=self.bus_factory).build(VREF, VAGND, bus_factory=self.bus_factory)
+        self.assertEqual(sorted(driver.analog_read_raw(0) for location, driver in drivers.items()
+                                if location.mux_address is None), [50, 200], "Direct devices should be readable")
+        results = schedulers[(1, MUX_ADDRESS)].scan()
+        self.assertEqual(list(results.values()), [[100] * 4], "Device behind switch should be readable")
+
+    def test_specs(self):
+        specs = discover([1, 3], bus_factory=self.bus_factory).specs(VREF, VAGND)
+        self.assertEqual([(spec.device, spec.mux_address, spec.mux_channel) for spec in specs[1]],
+                         [(0, None, None), (1, MUX_ADDRESS, 2)], "Wrong device specs")
+
+    def test_cache_round_trip(self):
+        topology = discover([1, 3], bus_factory=self.bus_factory)
+        topology.save(self.path)
+        self.assertEqual(Topology.load(self.path), topology, "Loaded topology should equal saved one")
+
+    def test_cache_malformed(self):
+        with open(self.path, 'w') as cache_file:
+            json.dump({'version': 1, 'muxes': {'1': []}, 'devices': [[1, 0x10, None, None]]}, cache_file)
+        with self.assertRaises(ValueError):
+            Topology.load(self.path)
+
+    def test_load_or_discover_uses_valid_cache(self):
+        topology = load_or_discover(self.path, [1, 3], bus_factory=self.bus_factory)
+        transactions = self.buses[1].transactions
+        self.assertEqual(load_or_discover(self.path, [1, 3], bus_factory=self.bus_factory), topology,
+                         "Cached topology should be returned")
+        # validation: read and clear switch, one probe direct, enable channel, probe, disable, restore
+        self.assertEqual(self.buses[1].transactions - transactions, 7, "Only known devices should be probed")
+
+    def test_load_or_discover_rediscovers(self):
+        load_or_discover(self.path, [1, 3], bus_factory=self.bus_factory)
+        self.mux.channels[2].clear()
+        self.mux.attach(4, DEVICE_ADDRESS << 3 | 1, SimPcf8591([2.0] * 4, VREF, VAGND))
+        topology = load_or_discover(self.path, [1, 3], bus_factory=self.bus_factory)
+        self.assertIn(Location(1, DEVICE_ADDRESS << 3 | 1, MUX_ADDRESS, 4), topology.devices, "Moved device should be found")
+        self.assertEqual(Topology.load(self.path), topology, "Cache should be updated")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,277 @@
+"""
+Discovery of PCF8591 devices on I2C buses, directly or behind TCA9548A switches.
+Every bus is probed by its own thread, so a rack with several buses takes as long as its slowest bus.
+On each bus the switches answering on MUX_ADDRESSES are found first and disabled, the eight PCF8591
+addresses are probed directly and then once more with each switch channel enabled on its own,
+switch registers are restored afterwards.
+
+The result is a Topology that builds drivers and scan schedulers, converts to DeviceSpec lists for
+MultiBusAcquisition and is saved to a JSON cache file. load_or_discover() reuses the cache on restart
+and only falls back to the full probe when the cached devices no longer answer.
+"""
+import collections
+import json
+import logging
+import os
+import threading
+
+import bus_registry
+from mux_scheduler import MuxScanScheduler
+from pcf8591 import Pcf8591, DEVICE_ADDRESS
+from process_acquisition import DeviceSpec
+from tca9548a import TCA9548A
+
+DEVICE_ADDRESSES = tuple(DEVICE_ADDRESS << 3 | device for device in range(8))
+MUX_ADDRESSES = tuple(range(0x70, 0x78))  # TCA9548A address range set by its pins A2 A1 A0
+MUX_CHANNELS = 8
+CACHE_VERSION = 1
+
+# mux_address and mux_channel are None for a device directly on the bus
+Location = collections.namedtuple('Location', 'bus address mux_address mux_channel')
+
+
+def probe(bus, address):
+    """Return byte read from address, None if nothing answers."""
+    try:
+        return bus.read_byte(address)
+    except IOError:
+        return None
+
+
+def open_bus(bus_number, bus_factory):
+    """Return bus handle from bus_factory or bus_registry -- only to be used internally."""
+    return bus_factory(bus_number) if bus_factory is not None else bus_registry.acquire_bus(bus_number)
+
+
+def close_bus(bus_number, bus_factory):
+    """Release handle taken by open_bus -- only to be used internally."""
+    if bus_factory is None:
+        bus_registry.release_bus(bus_number)
+
+
+def discover_bus(bus_number, bus, mux_addresses=MUX_ADDRESSES):
+    """Return (switch addresses, device locations) found on one bus."""
+    devices = []
+    with bus_registry.bus_lock(bus):
+        saved = {}  # switch address -> control register before discovery
+        for address in mux_addresses:
+            register = probe(bus, address)
+            if register is not None:
+                saved[address] = register
+        try:
+            for address in saved:
+                bus.write_byte(address, 0)
+            direct = set(address for address in DEVICE_ADDRESSES if probe(bus, address) is not None)
+            devices.extend(Location(bus_number, address, None, None) for address in sorted(direct))
+
+            for mux_address in saved:
+                for channel in range(MUX_CHANNELS):
+                    bus.write_byte(mux_address, 1 << channel)
+                    # a device colliding with a direct one can not be told apart from it and is not reported
+                    for address in DEVICE_ADDRESSES:
+                        if address not in direct and probe(bus, address) is not None:
+                            devices.append(Location(bus_number, address, mux_address, channel))
+                bus.write_byte(mux_address, 0)
+        finally:
+            for address, register in saved.items():
+                try:
+                    bus.write_byte(address, register)
+                except IOError:
+                    logging.error("Could not restore switch 0x{:02x} on bus {}.".format(address, bus_number))
+
+    return sorted(saved), devices
+
+
+def discover(bus_numbers, mux_addresses=MUX_ADDRESSES, bus_factory=None):
+    """Probe buses in parallel, one thread per bus, and return their Topology.
+
+    bus_factory(bus_number) may return SMBus compatible object used instead of shared handle.
+    """
+    results = {}
+
+    def run(bus_number):
+        try:
+            bus = open_bus(bus_number, bus_factory)
+        except IOError:
+            logging.error("Bus on channel {} is not available.".format(bus_number))
+            return
+        try:
+            results[bus_number] = discover_bus(bus_number, bus, mux_addresses)
+        except IOError as error:
+            logging.error("Discovery of bus {} failed: {}".format(bus_number, error))
+        finally:
+            close_bus(bus_number, bus_factory)
+
+    workers = [threading.Thread(target=run, args=(bus_number,), daemon=True) for bus_number in bus_numbers]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    muxes = dict((bus_number, muxes) for bus_number, (muxes, _) in results.items())
+    devices = [location for _, locations in results.values() for location in locations]
+    return Topology(muxes, devices)
+
+
+class Topology(object):
+    """Switches and PCF8591 devices found on a set of buses."""
+
+    # muxes is dict bus number -> list of switch addresses, devices is list of Location
+    def __init__(self, muxes, devices):
+        """Init topology."""
+        self.muxes = dict((bus_number, sorted(addresses)) for bus_number, addresses in muxes.items())
+        self.devices = sorted(devices, key=lambda location: (location.bus, location.mux_address or 0,
+                                                             location.mux_channel or 0, location.address))
+
+    def __eq__(self, other):
+        return isinstance(other, Topology) and (self.muxes, self.devices) == (other.muxes, other.devices)
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def buses(self):
+        """Sorted bus numbers covered by the topology."""
+        return sorted(self.muxes)
+
+    def build(self, vref, vagnd, bus_factory=None, **options):
+        """Return (drivers, schedulers) for every device.
+
+        drivers is dict Location -> Pcf8591, schedulers dict (bus, switch address) -> MuxScanScheduler
+        holding the drivers behind that switch, options are passed on to every Pcf8591.
+        """
+        handles = dict((bus_number, bus_factory(bus_number) if bus_factory is not None else None)
+                       for bus_number in self.buses)
+        drivers = {}
+        schedulers = {}
+        for location in self.devices:
+            device = location.address & 7
+            bus = handles.get(location.bus)
+            driver = Pcf8591(device & 1, device >> 1 & 1, device >> 2 & 1, vref, vagnd,
+                             bus_number=location.bus, bus=bus, **options)
+            drivers[location] = driver
+            if location.mux_address is None:
+                continue
+            key = (location.bus, location.mux_address)
+            if key not in schedulers:
+                schedulers[key] = MuxScanScheduler(TCA9548A(location.mux_address, location.bus, bus, shadow=True))
+            schedulers[key].add(driver, location.mux_channel)
+
+        return drivers, schedulers
+
+    def specs(self, vref, vagnd):
+        """Return dict bus number -> list of DeviceSpec for MultiBusAcquisition."""
+        buses = dict((bus_number, []) for bus_number in self.buses)
+        for location in self.devices:
+            buses[location.bus].append(DeviceSpec(location.address & 7, vref, vagnd,
+                                                  location.mux_address, location.mux_channel))
+        return buses
+
+    def validate(self, bus_factory=None):
+        """Return True if every switch and device still answers where the topology expects it.
+
+        Only the known addresses are probed, which is much faster than discover().
+        """
+        for bus_number in self.buses:
+            try:
+                bus = open_bus(bus_number, bus_factory)
+            except IOError:
+                return False
+            try:
+                with bus_registry.bus_lock(bus):
+                    if not self.validate_bus(bus_number, bus):
+                        return False
+            finally:
+                close_bus(bus_number, bus_factory)
+        return True
+
+    def validate_bus(self, bus_number, bus):
+        """Probe known devices of one bus, switch registers are restored -- only to be used internally."""
+        saved = {}
+        for address in self.muxes[bus_number]:
+            register = probe(bus, address)
+            if register is None:
+                return False
+            saved[address] = register
+        try:
+            for address in saved:
+                bus.write_byte(address, 0)
+            for location in self.devices:
+                if location.bus != bus_number:
+                    continue
+                if location.mux_address is not None:
+                    bus.write_byte(location.mux_address, 1 << location.mux_channel)
+                found = probe(bus, location.address) is not None
+                if location.mux_address is not None:
+                    bus.write_byte(location.mux_address, 0)
+                if not found:
+                    return False
+        except IOError:
+            return False
+        finally:
+            for address, register in saved.items():
+                try:
+                    bus.write_byte(address, register)
+                except IOError:
+                    logging.error("Could not restore switch 0x{:02x} on bus {}.".format(address, bus_number))
+        return True
+
+    def to_dict(self):
+        """Return JSON serializable representation."""
+        return {'version': CACHE_VERSION,
+                'muxes': dict((str(bus_number), addresses) for bus_number, addresses in self.muxes.items()),
+                'devices': [list(location) for location in self.devices]}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Return Topology from to_dict() output, raise ValueError if data is not a valid topology."""
+        try:
+            if data['version'] != CACHE_VERSION:
+                raise ValueError("Unsupported topology version {}.".format(data['version']))
+            muxes = dict((int(bus_number), [int(address) for address in addresses])
+                         for bus_number, addresses in data['muxes'].items())
+            devices = [Location(*location) for location in data['devices']]
+        except (KeyError, TypeError, AttributeError) as error:
+            raise ValueError("Malformed topology: {}".format(error))
+        for location in devices:
+            if location.bus not in muxes or location.address not in DEVICE_ADDRESSES or (
+                    location.mux_address is not None and (location.mux_address not in muxes[location.bus]
+                                                          or location.mux_channel not in range(MUX_CHANNELS))):
+                raise ValueError("Malformed topology entry {}.".format(location))
+        return cls(muxes, devices)
+
+    def save(self, path):
+        """Write topology to cache file, the file is replaced atomically."""
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as cache_file:
+            json.dump(self.to_dict(), cache_file, indent=2)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Return Topology read from cache file, raise ValueError if it is not a valid cache."""
+        with open(path) as cache_file:
+            try:
+                data = json.load(cache_file)
+            except ValueError as error:
+                raise ValueError("{} is not a topology cache: {}".format(path, error))
+        return cls.from_dict(data)
+
+
+def load_or_discover(path, bus_numbers, mux_addresses=MUX_ADDRESSES, bus_factory=None):
+    """Return topology of bus_numbers from cache file if it still validates, otherwise discover and cache it."""
+    try:
+        topology = Topology.load(path)
+    except (IOError, ValueError) as error:
+        logging.info("Topology cache not used: {}".format(error))
+    else:
+        if topology.buses == sorted(bus_numbers) and topology.validate(bus_factory):
+            return topology
+        logging.info("Cached topology {} does not match the hardware, discovering again.".format(path))
+
+    topology = discover(bus_numbers, mux_addresses, bus_factory)
+    try:
+        topology.save(path)
+    except IOError as error:
+        logging.error("Could not write topology cache {}: {}".format(path, error))
+    return topology